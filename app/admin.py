@@ -2,18 +2,52 @@ import os
 import uuid
 
 from django.contrib import admin
+from django.db.models import Sum
 
-from app.supabase_utils import upload_image_to_supabase
+from app.catalog import bump_catalog_version
+from app.supabase_utils import upload_images_to_supabase
 
 from .forms import ItemAdminForm
-from .models import ItemCategory, ItemImage, Items, Order
+from .models import (
+    ItemCategory,
+    ItemImage,
+    Items,
+    ItemVariant,
+    MpesaCallback,
+    Order,
+    StkPushRequest,
+)
+
+
+class ItemVariantInline(admin.TabularInline):
+    model = ItemVariant
+    fields = ["size", "stock", "price_delta"]
+    extra = 1
+    # carts and orders assume every item can be bought in at least one size
+    min_num = 1
+    validate_min = True
+
+    def get_formset(self, request, obj=None, **kwargs):
+        # InlineModelAdmin passes min_num to the formset but not validate_min
+        kwargs.setdefault("validate_min", self.validate_min)
+        return super().get_formset(request, obj, **kwargs)
 
 
 @admin.register(Items)
 class ItemAdmin(admin.ModelAdmin):
     form = ItemAdminForm
     # remove image inline so admin shows only the images FileField on the form
-    list_display = ["name", "category", "price", "stock"]
+    inlines = [ItemVariantInline]
+    list_display = ["name", "category", "price", "total_stock"]
+
+    def get_queryset(self, request):
+        return (
+            super().get_queryset(request).annotate(total_stock=Sum("variants__stock"))
+        )
+
+    @admin.display(description="Stock", ordering="total_stock")
+    def total_stock(self, obj):
+        return obj.total_stock or 0
 
     def render_change_form(
         self, request, context, add=False, change=False, form_url="", obj=None
@@ -27,18 +61,26 @@ class ItemAdmin(admin.ModelAdmin):
         # proceed with save (keep original behavior)
         super().save_model(request, obj, form, change)
         files = request.FILES.getlist("images")
-        for f in files:
-            try:
-                filename = f"{uuid.uuid4().hex}_{os.path.basename(f.name)}"
-                # upload to supabase; your util should return the public URL
-                public_url = upload_image_to_supabase(f, filename)
-                ItemImage.objects.create(item=obj, image_url=public_url)
-            except Exception as e:
+        # upload to supabase in parallel; each result carries its public URL
+        results = upload_images_to_supabase(
+            (f, f"{uuid.uuid4().hex}_{os.path.basename(f.name)}") for f in files
+        )
+        images = []
+        for f, public_url, error in results:
+            if error is not None:
                 self.message_user(
                     request,
-                    f"Failed to save/upload image {getattr(f, 'name', '<file>')}: {e}",
+                    f"Failed to save/upload image {getattr(f, 'name', '<file>')}: {error}",
                     level="error",
                 )
+            else:
+                images.append(ItemImage(item=obj, image_url=public_url))
+        if images:
+            ItemImage.objects.bulk_create(images)
+            obj.update_image_summary()
+            # bulk_create sends no post_save: drop the pages cached since
+            # the item itself was saved (its snapshot runs after commit)
+            bump_catalog_version()
 
 
 @admin.register(ItemCategory)
@@ -47,3 +89,5 @@ class ItemCategoryAdmin(admin.ModelAdmin):
 
 
 admin.site.register(Order)
+admin.site.register(StkPushRequest)
+admin.site.register(MpesaCallback)
@@ -0,0 +1,80 @@
+import time
+
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+
+from .images import ResponsiveImage
+from .models import ItemCategory, Items
+
+CATALOG_VERSION_KEY = "catalog:version"
+CATEGORY_THUMBNAILS_KEY = "catalog:category-images:{version}"
+CATEGORY_THUMBNAILS_TIMEOUT = 60 * 60  # 1 hour; the version key handles freshness
+
+# per-process memo of the last (version, thumbnails) pair served by this worker
+_thumbnails_memo = (None, None)
+
+
+def get_catalog_version():
+    """
+    Return the current catalog version, initialising it if the cache is empty.
+    The version changes whenever an item, image or category is saved/deleted.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns(), None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    # a fresh timestamp (rather than incr) never collides with an evicted version
+    cache.set(CATALOG_VERSION_KEY, time.time_ns(), None)
+
+
+def _load_category_thumbnails():
+    """
+    Fetch every category together with the primary image of its first item in
+    a single query. Returns (categories, {category_id: ResponsiveImage}).
+    """
+    first_item = Items.objects.filter(category=OuterRef("pk")).order_by("pk")
+    categories = list(
+        ItemCategory.objects.annotate(
+            thumbnail_url=Subquery(first_item.values("primary_image_url")[:1]),
+            thumbnail_variants=Subquery(
+                first_item.values("primary_image_variants")[:1]
+            ),
+        ).order_by("pk")
+    )
+    # categories without an image are left out so templates fall back to default
+    category_images = {
+        c.id: ResponsiveImage(c.thumbnail_url, c.thumbnail_variants)
+        for c in categories
+        if c.thumbnail_url
+    }
+    return categories, category_images
+
+
+def get_category_thumbnails(request=None):
+    """
+    Return (categories, {category_id: ResponsiveImage}) for the navbar and home page.
+    The result is memoized on the request, then per process and in the shared
+    cache for as long as the catalog version is unchanged, so a page that uses
+    it from both the view and the context processor computes it at most once.
+    """
+    global _thumbnails_memo
+    if request is not None and hasattr(request, "_category_thumbnails"):
+        return request._category_thumbnails
+
+    version = get_catalog_version()
+    memo_version, data = _thumbnails_memo
+    if memo_version != version:
+        key = CATEGORY_THUMBNAILS_KEY.format(version=version)
+        data = cache.get(key)
+        if data is None:
+            data = _load_category_thumbnails()
+            cache.set(key, data, CATEGORY_THUMBNAILS_TIMEOUT)
+        _thumbnails_memo = (version, data)
+
+    if request is not None:
+        request._category_thumbnails = data
+    return data
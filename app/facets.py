@@ -0,0 +1,152 @@
+from decimal import Decimal
+
+from django.core.cache import cache
+
+from .models import Items
+
+FACET_INDEX_KEY = "catalog:facets:{category_id}"
+# stock moves through bulk UPDATEs (reservations, restocks) that send no
+# signals, so the in-stock facet is allowed to lag by at most this long
+FACET_INDEX_TIMEOUT = 60
+
+# price facet buckets in Ksh: key -> (min inclusive, max exclusive or None)
+PRICE_RANGES = {
+    "0-1000": (Decimal("0"), Decimal("1000")),
+    "1000-2500": (Decimal("1000"), Decimal("2500")),
+    "2500-5000": (Decimal("2500"), Decimal("5000")),
+    "5000-": (Decimal("5000"), None),
+}
+PRICE_LABELS = {
+    "0-1000": "Under Ksh 1,000",
+    "1000-2500": "Ksh 1,000 - 2,500",
+    "2500-5000": "Ksh 2,500 - 5,000",
+    "5000-": "Over Ksh 5,000",
+}
+
+
+def _price_range(price):
+    for key, (low, high) in PRICE_RANGES.items():
+        if price >= low and (high is None or price < high):
+            return key
+    return None
+
+
+def _bit_count(bitmap):
+    return bin(bitmap).count("1")
+
+
+class FacetIndex:
+    """
+    Bitmap index over one category's items. Each item owns one bit position
+    and every facet value (size, price range, in stock) keeps an int bitmap
+    of the items that have it, so filtering is AND/OR over ints and a facet
+    count is a popcount. With "in stock" and sizes both selected, the chosen
+    sizes themselves must be in stock.
+    """
+
+    def __init__(self, rows):
+        # rows: (item_id, price, size, stock), one per variant; size and stock
+        # are None for items without variants
+        self.item_ids = []
+        self.sizes = {}
+        self.sizes_in_stock = {}
+        self.prices = {key: 0 for key in PRICE_RANGES}
+        self.in_stock = 0
+        positions = {}
+        for item_id, price, size, stock in rows:
+            position = positions.get(item_id)
+            if position is None:
+                position = positions[item_id] = len(self.item_ids)
+                self.item_ids.append(item_id)
+                price_key = _price_range(price)
+                if price_key is not None:
+                    self.prices[price_key] |= 1 << position
+            bit = 1 << position
+            if size:
+                self.sizes[size] = self.sizes.get(size, 0) | bit
+            if stock and stock > 0:
+                self.in_stock |= bit
+                if size:
+                    self.sizes_in_stock[size] = self.sizes_in_stock.get(size, 0) | bit
+        self.all = (1 << len(self.item_ids)) - 1
+
+    def _facet_bitmaps(self, sizes, price, in_stock):
+        """The bitmap selected by each active facet; values within one are ORed."""
+        bitmaps = {}
+        if sizes:
+            size_bitmaps = self.sizes_in_stock if in_stock else self.sizes
+            bitmap = 0
+            for size in sizes:
+                bitmap |= size_bitmaps.get(size, 0)
+            bitmaps["size"] = bitmap
+        if price:
+            bitmaps["price"] = self.prices.get(price, 0)
+        if in_stock:
+            bitmaps["in_stock"] = self.in_stock
+        return bitmaps
+
+    def _match(self, bitmaps, skip=None):
+        match = self.all
+        for facet, bitmap in bitmaps.items():
+            if facet != skip:
+                match &= bitmap
+        return match
+
+    def filter(self, sizes=(), price=None, in_stock=False):
+        """Ids of the items matching every active facet."""
+        match = self._match(self._facet_bitmaps(sizes, price, in_stock))
+        return [
+            item_id
+            for position, item_id in enumerate(self.item_ids)
+            if match >> position & 1
+        ]
+
+    def counts(self, sizes=(), price=None, in_stock=False):
+        """
+        Count for every facet value, each computed against the other active
+        facets only, so picking a size doesn't zero out the other sizes.
+        """
+        bitmaps = self._facet_bitmaps(sizes, price, in_stock)
+        size_base = self._match(bitmaps, skip="size")
+        price_base = self._match(bitmaps, skip="price")
+        size_bitmaps = self.sizes_in_stock if in_stock else self.sizes
+        return {
+            "size": {
+                size: _bit_count(size_bitmaps.get(size, 0) & size_base)
+                for size in sorted(self.sizes)
+            },
+            "price": {
+                key: _bit_count(bitmap & price_base)
+                for key, bitmap in self.prices.items()
+            },
+            # what the listing would hold with "in stock" switched on
+            "in_stock": _bit_count(
+                self._match(self._facet_bitmaps(sizes, price, True))
+            ),
+            "total": _bit_count(self._match(bitmaps)),
+        }
+
+
+def _load_facet_index(category_id):
+    return FacetIndex(
+        Items.objects.filter(category_id=category_id)
+        .order_by("id")
+        .values_list("id", "price", "variants__size", "variants__stock")
+        .iterator()
+    )
+
+
+def get_facet_index(category_id):
+    """Return the FacetIndex for a category, building it with one query on a miss."""
+    key = FACET_INDEX_KEY.format(category_id=category_id)
+    index = cache.get(key)
+    if index is None:
+        index = _load_facet_index(category_id)
+        cache.set(key, index, FACET_INDEX_TIMEOUT)
+    return index
+
+
+def invalidate_facet_index(category_id):
+    # only the changed category is rebuilt; every other index stays cached
+    if category_id is not None:
+        cache.delete(FACET_INDEX_KEY.format(category_id=category_id))
@@ -53,7 +53,7 @@ class UserModelForm(forms.ModelForm):
         fields = ["username", "email", "password"]
 
 
-# Admin form for Items with multiple image uploads and size normalization
+# Admin form for Items with multiple image uploads (sizes are ItemVariant inlines)
 class ItemAdminForm(forms.ModelForm):
     # use MultiFileField so validation accepts lists
     images = MultiFileField(
@@ -61,11 +61,10 @@ class ItemAdminForm(forms.ModelForm):
         widget=MultiFileInput(attrs={"multiple": True}),
         help_text="Upload one or more images",
     )
-    sizes = forms.CharField(required=False, help_text="Enter sizes like: S,M,L,XL")
 
     class Meta:
         model = Items
-        fields = ["name", "category", "price", "stock", "description", "sizes"]
+        fields = ["name", "category", "price", "description"]
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
@@ -82,7 +81,8 @@ class ItemAdminForm(forms.ModelForm):
                 qs = None
             if qs and qs.exists():
                 previews = "".join(
-                    f'<img src="{img.image_url}" width="100" height="100" style="margin:5px;" />'
+                    f'<img src="{img.responsive.thumbnail}" width="100" height="100" '
+                    f'style="margin:5px;" loading="lazy" />'
                     for img in qs
                 )
                 self.fields["images"].help_text += mark_safe(
@@ -0,0 +1,139 @@
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .images import VARIANT_FORMATS, render_variants
+from .models import ItemImage, Items
+from .supabase_utils import (
+    download_image_from_supabase,
+    storage_path,
+    upload_images_to_supabase,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def claim_pending_images(limit):
+    """
+    Lock up to `limit` unprocessed images that are due for this worker. Rows
+    locked by other workers are skipped, so several workers can run side by
+    side. Must be called inside a transaction.
+    """
+    qs = (
+        ItemImage.objects.filter(processed_at__isnull=True)
+        .filter(
+            Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=timezone.now())
+        )
+        .order_by("pk")
+    )
+    if connection.features.has_select_for_update_skip_locked:
+        qs = qs.select_for_update(skip_locked=True)
+    return list(qs[:limit])
+
+
+def _retry_later(image, error):
+    """
+    Schedule another attempt after a storage failure. After the last one the
+    image is marked processed as it is, so templates keep the original.
+    """
+    image.attempts += 1
+    if image.attempts >= settings.IMAGE_PROCESSING_MAX_ATTEMPTS:
+        logger.error("Giving up on ItemImage %s: %s", image.pk, error)
+        image.processed_at = timezone.now()
+    else:
+        logger.warning("Will retry ItemImage %s: %s", image.pk, error)
+        image.next_attempt_at = timezone.now() + timedelta(
+            seconds=settings.IMAGE_PROCESSING_RETRY_BACKOFF * 2 ** (image.attempts - 1)
+        )
+    # nothing the pages show has changed, so skip the post_save cache refresh
+    ItemImage.objects.filter(pk=image.pk).update(
+        attempts=image.attempts,
+        next_attempt_at=image.next_attempt_at,
+        processed_at=image.processed_at,
+    )
+    return image
+
+
+def process_image(image):
+    """
+    Download the original, store its resized WebP/JPEG copies next to it and
+    record them with the original's dimensions. An image that can't be
+    decoded is marked processed without variants, so templates keep the
+    original; failed downloads and uploads are retried (see _retry_later).
+    """
+    try:
+        data = download_image_from_supabase(image.image_url)
+    except Exception as e:
+        return _retry_later(image, e)
+    try:
+        width, height, rendered = render_variants(data)
+    except Exception as e:
+        logger.warning("Could not decode ItemImage %s: %s", image.pk, e)
+        image.processed_at = timezone.now()
+        image.save(update_fields=["processed_at"])
+        return image
+
+    stem = os.path.splitext(storage_path(image.image_url))[0]
+    uploads = []
+    for key, variant_width, content in rendered:
+        _, content_type, extension, _ = VARIANT_FORMATS[key]
+        name = f"variants/{stem}_{variant_width}w.{extension}"
+        uploads.append((SimpleUploadedFile(name, content, content_type), name))
+    # reprocessing overwrites the copies made last time
+    results = upload_images_to_supabase(uploads, upsert=True)
+
+    variants = {}
+    for (key, variant_width, _), (_, url, error) in zip(rendered, results):
+        if error is not None:
+            logger.warning(
+                "Upload of the %spx %s copy of ItemImage %s failed: %s",
+                variant_width,
+                key,
+                image.pk,
+                error,
+            )
+            continue
+        variants.setdefault(key, {})[str(variant_width)] = url
+    if rendered and not variants:
+        # storage is likely down; nothing was stored, so try again later
+        return _retry_later(image, results[0][2])
+
+    image.width = width
+    image.height = height
+    image.variants = variants
+    image.processed_at = timezone.now()
+    # post_save refreshes the catalog caches and snapshots once this commits
+    image.save(update_fields=["width", "height", "variants", "processed_at"])
+    # the item's summary copies the primary image's variants
+    Items.objects.filter(pk=image.item_id).update(**Items.image_summary_expressions())
+    logger.info(
+        "Processed ItemImage %s: %sx%s, %d variant(s)",
+        image.pk,
+        width,
+        height,
+        sum(len(urls) for urls in variants.values()),
+    )
+    return image
+
+
+def process_pending_images(limit=10):
+    """
+    Process up to `limit` unprocessed images, each in its own transaction so
+    the slow download and uploads only hold the lock on their own row.
+    Returns the number processed.
+    """
+    processed = 0
+    while processed < limit:
+        with transaction.atomic():
+            images = claim_pending_images(1)
+            if not images:
+                break
+            process_image(images[0])
+        processed += 1
+    return processed
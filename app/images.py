@@ -0,0 +1,113 @@
+import io
+
+from PIL import Image, ImageOps
+
+# widths (px) of the resized copies made of every uploaded image; images are
+# never enlarged (see render_variants)
+VARIANT_WIDTHS = (160, 320, 640, 1280)
+# format key -> (Pillow format, content type, file extension, save options)
+VARIANT_FORMATS = {
+    "webp": ("WEBP", "image/webp", "webp", {"quality": 80, "method": 4}),
+    "jpeg": (
+        "JPEG",
+        "image/jpeg",
+        "jpg",
+        {"quality": 82, "optimize": True, "progressive": True},
+    ),
+}
+# the src used when nothing better is known: wide enough for a card or carousel
+DEFAULT_WIDTH = 640
+
+
+def render_variants(data):
+    """
+    Decode an image and resize it to every VARIANT_WIDTHS width below its own,
+    plus its own width when that is below the largest, in every
+    VARIANT_FORMATS format. Returns (width, height, [(format key, width,
+    encoded bytes)]), where width and height are those of the original.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        # phone photos are often stored sideways with an EXIF rotation
+        image = ImageOps.exif_transpose(original)
+        image.load()
+    width, height = image.size
+    widths = [w for w in VARIANT_WIDTHS if w < width]
+    if width < VARIANT_WIDTHS[-1]:
+        # the full resolution re-encoded, so the widest copy loses no detail
+        widths.append(width)
+
+    rendered = []
+    for target in widths:
+        # reducing_gap shrinks large originals cheaply before the Lanczos pass
+        resized = image.resize(
+            (target, max(1, round(height * target / width))),
+            Image.LANCZOS,
+            reducing_gap=3.0,
+        )
+        for key, (pil_format, _, _, options) in VARIANT_FORMATS.items():
+            frame = resized
+            if pil_format == "JPEG" and frame.mode != "RGB":
+                # JPEG has no alpha channel: flatten onto white
+                background = Image.new("RGB", frame.size, "white")
+                rgba = frame.convert("RGBA")
+                background.paste(rgba, mask=rgba.getchannel("A"))
+                frame = background
+            elif frame.mode not in ("RGB", "RGBA"):
+                frame = frame.convert("RGBA")
+            buffer = io.BytesIO()
+            frame.save(buffer, pil_format, **options)
+            rendered.append((key, target, buffer.getvalue()))
+    return width, height, rendered
+
+
+class ResponsiveImage:
+    """
+    An uploaded image together with its resized copies, as stored in
+    ItemImage.variants: {format key: {str(width): url}}. Falls back to the
+    original URL for images that haven't been processed yet.
+    """
+
+    def __init__(self, url, variants=None, width=None, height=None):
+        self.url = url
+        self.variants = variants or {}
+        self.width = width
+        self.height = height
+
+    def __bool__(self):
+        return bool(self.url)
+
+    def __str__(self):
+        return self.src
+
+    def _urls(self, key):
+        return sorted(
+            (int(width), url) for width, url in self.variants.get(key, {}).items()
+        )
+
+    def url_for(self, width, key="jpeg"):
+        """The narrowest copy at least `width` wide, else the widest there is."""
+        urls = self._urls(key)
+        for variant_width, url in urls:
+            if variant_width >= width:
+                return url
+        return urls[-1][1] if urls else self.url
+
+    def srcset_for(self, key):
+        return ", ".join(f"{url} {width}w" for width, url in self._urls(key))
+
+    @property
+    def src(self):
+        return self.url_for(DEFAULT_WIDTH)
+
+    @property
+    def thumbnail(self):
+        # navbar icons, the cart and admin previews show at most ~100px
+        return self.url_for(VARIANT_WIDTHS[0])
+
+    @property
+    def srcset(self):
+        return self.srcset_for("jpeg")
+
+    @property
+    def webp_srcset(self):
+        return self.srcset_for("webp")
@@ -0,0 +1,110 @@
+import logging
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Sum, Value, When
+
+from .models import ItemVariant, Order
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientStock(Exception):
+    def __init__(self, variants):
+        self.variants = variants
+        names = ", ".join(str(variant) for variant in variants)
+        super().__init__(f"Insufficient stock for: {names}")
+
+
+def _quantity_case(quantities):
+    """CASE id WHEN ... THEN qty END for a {variant_id: quantity} mapping."""
+    return Case(
+        *[When(pk=pk, then=Value(qty)) for pk, qty in quantities.items()],
+        output_field=IntegerField(),
+    )
+
+
+class _ReservationFailed(Exception):
+    pass
+
+
+def reserve_stock(quantities):
+    """
+    Atomically take `quantities` ({variant_id: quantity}) out of stock with
+    one conditional UPDATE (stock = stock - n WHERE stock >= n). Raises
+    InsufficientStock, leaving every variant untouched, if any is short.
+    """
+    quantities = {k: v for k, v in quantities.items() if v > 0}
+    if not quantities:
+        return
+    needed = _quantity_case(quantities)
+    try:
+        with transaction.atomic():
+            updated = ItemVariant.objects.filter(
+                pk__in=quantities, stock__gte=needed
+            ).update(stock=F("stock") - needed)
+            if updated != len(quantities):
+                raise _ReservationFailed
+    except _ReservationFailed:
+        short = ItemVariant.objects.select_related("item").filter(
+            pk__in=quantities, stock__lt=needed
+        )
+        raise InsufficientStock(list(short))
+
+
+def restock(quantities):
+    """Put `quantities` ({variant_id: quantity}) back with one UPDATE."""
+    quantities = {k: v for k, v in quantities.items() if v > 0}
+    if quantities:
+        ItemVariant.objects.filter(pk__in=quantities).update(
+            stock=F("stock") + _quantity_case(quantities)
+        )
+
+
+def cart_quantities(lines):
+    """Total quantity per variant across cart lines."""
+    quantities = Counter()
+    for line in lines:
+        quantities[line.variant.pk] += line.quantity
+    return quantities
+
+
+def variant_quantities(order_items):
+    """{variant_id: quantity} for an OrderItem queryset, in one query."""
+    return dict(
+        order_items.filter(variant__isnull=False)
+        .order_by()
+        .values_list("variant_id")
+        .annotate(quantity=Sum("quantity"))
+    )
+
+
+def order_quantities(order):
+    return variant_quantities(order.items.all())
+
+
+def commit_order_stock(order):
+    """Make a paid order's stock reservation final. `order` must be locked."""
+    if order.stock_status == Order.STOCK_RELEASED:
+        # paid after its reservation had been released (e.g. swept as abandoned)
+        try:
+            reserve_stock(order_quantities(order))
+        except InsufficientStock as e:
+            logger.error("Order %s was paid but is oversold: %s", order.id, e)
+    elif order.stock_status != Order.STOCK_RESERVED:
+        return
+    order.stock_status = Order.STOCK_COMMITTED
+    order.save(update_fields=["stock_status"])
+
+
+def release_order_stock(order):
+    """
+    Return an unpaid order's reserved stock. `order` must be locked
+    (select_for_update) so the release happens at most once.
+    """
+    if order.stock_status != Order.STOCK_RESERVED or order.is_paid:
+        return False
+    restock(order_quantities(order))
+    order.stock_status = Order.STOCK_RELEASED
+    order.save(update_fields=["stock_status"])
+    return True
@@ -0,0 +1,87 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+PAGE_SIZE = 24
+
+# sort key -> ordering; every ordering ends on id so the cursor is unique
+SORT_OPTIONS = {
+    "newest": ("-id",),
+    "price": ("price", "id"),
+    "-price": ("-price", "-id"),
+    "name": ("name", "id"),
+}
+SORT_LABELS = {
+    "newest": "Newest",
+    "price": "Price: low to high",
+    "-price": "Price: high to low",
+    "name": "Name",
+}
+DEFAULT_SORT = "newest"
+
+
+def _encode_cursor(item, ordering):
+    values = [str(getattr(item, field.lstrip("-"))) for field in ordering]
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+def _decode_cursor(cursor, ordering, model):
+    """
+    The cursor's values converted to their fields' types, or None if it is
+    malformed or any value doesn't fit its field (e.g. a non-numeric id).
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        if not isinstance(values, list) or len(values) != len(ordering):
+            return None
+        return [
+            model._meta.get_field(field.lstrip("-")).to_python(value)
+            for field, value in zip(ordering, values)
+        ]
+    except (
+        binascii.Error,
+        UnicodeError,
+        ValueError,
+        ValidationError,
+        FieldDoesNotExist,
+    ):
+        return None
+
+
+def _after(ordering, values):
+    """
+    Keyset condition for rows after `values` in `ordering`, e.g. for
+    ("price", "id"): price > p OR (price = p AND id > i).
+    """
+    condition = Q()
+    for i, field in enumerate(ordering):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        step = Q(**{f"{name}__{lookup}": values[i]})
+        for prev_field, prev_value in zip(ordering[:i], values[:i]):
+            step &= Q(**{prev_field.lstrip("-"): prev_value})
+        condition |= step
+    return condition
+
+
+def keyset_page(queryset, sort, cursor=None, page_size=PAGE_SIZE):
+    """
+    Return (items, next_cursor) for the page of `queryset` after `cursor`.
+    Unlike OFFSET pagination every page is a single index range scan, so deep
+    pages cost the same as the first. An invalid cursor yields the first page.
+    """
+    ordering = SORT_OPTIONS[sort]
+    queryset = queryset.order_by(*ordering)
+    values = _decode_cursor(cursor, ordering, queryset.model) if cursor else None
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+
+    items = list(queryset[: page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = _encode_cursor(items[-1], ordering)
+    return items, next_cursor
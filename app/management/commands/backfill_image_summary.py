@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from app.models import Items
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute Items.primary_image_url and Items.image_count from the "
+        "ItemImage table, in primary-key batches."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        expressions = Items.image_summary_expressions()
+        last_pk = 0
+        total = 0
+        while True:
+            pks = list(
+                Items.objects.filter(pk__gt=last_pk)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not pks:
+                break
+            with transaction.atomic():
+                total += Items.objects.filter(pk__gte=pks[0], pk__lte=pks[-1]).update(
+                    **expressions
+                )
+            last_pk = pks[-1]
+        self.stdout.write(self.style.SUCCESS(f"Updated {total} item(s)"))
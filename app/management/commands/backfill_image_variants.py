@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+
+from app.image_pipeline import process_pending_images
+from app.models import ItemImage
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the resized copies of every item image that doesn't have them "
+        "yet, in batches. Images uploaded before the pipeline existed are "
+        "picked up automatically."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        group = parser.add_mutually_exclusive_group()
+        group.add_argument(
+            "--failed",
+            action="store_true",
+            help="Also retry processed images that ended up without variants",
+        )
+        group.add_argument(
+            "--reprocess",
+            action="store_true",
+            help="Redo every image, e.g. after changing the variant widths",
+        )
+
+    def handle(self, *args, **options):
+        if options["reprocess"]:
+            requeued = ItemImage.objects.filter(processed_at__isnull=False)
+        elif options["failed"]:
+            requeued = ItemImage.objects.filter(processed_at__isnull=False, variants={})
+        else:
+            requeued = ItemImage.objects.none()
+        count = requeued.update(processed_at=None, attempts=0, next_attempt_at=None)
+        if count:
+            self.stdout.write(f"Queued {count} processed image(s) again")
+
+        total = 0
+        while True:
+            processed = process_pending_images(options["batch_size"])
+            total += processed
+            if processed < options["batch_size"]:
+                break
+            self.stdout.write(f"Processed {total} image(s)...")
+        self.stdout.write(self.style.SUCCESS(f"Processed {total} image(s)"))
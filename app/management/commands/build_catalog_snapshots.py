@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.snapshots import build_snapshots, snapshot_root
+
+
+class Command(BaseCommand):
+    help = (
+        "Pre-render the home page and the first page of each category to "
+        "static, precompressed HTML under CATALOG_SNAPSHOT_ROOT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--category",
+            type=int,
+            action="append",
+            dest="categories",
+            help="Only re-render this category (repeatable); home is always rebuilt",
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        count = build_snapshots(options["categories"])
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rendered home and {count} category page(s) to {snapshot_root()} "
+                f"in {time.monotonic() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from app.image_pipeline import process_pending_images
+
+
+class Command(BaseCommand):
+    help = (
+        "Make the resized WebP/JPEG copies of newly uploaded item images. Run "
+        "one or more of these alongside the web server; workers never pick "
+        "up the same image."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=5.0,
+            help="Seconds to sleep when no image is waiting",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Process one batch and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_images(options["batch_size"])
+            if processed:
+                self.stdout.write(f"Processed {processed} image(s)")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["poll_interval"])
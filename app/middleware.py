@@ -0,0 +1,89 @@
+import os
+import re
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from django.urls import Resolver404, resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .snapshots import category_snapshot_path, home_snapshot_path
+
+# preferred first; the plain file is always the fallback
+SNAPSHOT_ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+
+
+class CatalogSnapshotMiddleware:
+    """
+    Serve pre-rendered catalog pages (see build_catalog_snapshots) to
+    visitors without a session, ahead of the session, auth and messages
+    middleware. Anything else falls through to the normal view.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if settings.CATALOG_SNAPSHOTS_ENABLED:
+            response = self.serve_snapshot(request)
+            if response is not None:
+                return response
+        return self.get_response(request)
+
+    def _snapshot_path(self, request):
+        if request.method != "GET" or request.META.get("QUERY_STRING"):
+            return None
+        # a session or pending flash messages may change what the page shows
+        if (
+            settings.SESSION_COOKIE_NAME in request.COOKIES
+            or "messages" in request.COOKIES
+        ):
+            return None
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        if match.url_name == "store-home":
+            return home_snapshot_path()
+        if match.url_name == "category_items":
+            return category_snapshot_path(match.kwargs["category_id"])
+        return None
+
+    def serve_snapshot(self, request):
+        path = self._snapshot_path(request)
+        if path is None:
+            return None
+
+        accept_encoding = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        for encoding, suffix in SNAPSHOT_ENCODINGS + [(None, "")]:
+            if encoding and not re.search(rf"\b{encoding}\b", accept_encoding):
+                continue
+            candidate = path.with_name(path.name + suffix)
+            try:
+                stat = os.stat(candidate)
+            except FileNotFoundError:
+                continue
+            break
+        else:
+            return None
+        if time.time() - stat.st_mtime > settings.CATALOG_SNAPSHOT_MAX_AGE:
+            # stale stock counts and badges: let the view render the page
+            return None
+
+        etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}{suffix}"'
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(stat.st_mtime)
+        )
+        if response is None:
+            with open(candidate, "rb") as f:
+                response = HttpResponse(
+                    f.read(), content_type="text/html; charset=utf-8"
+                )
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(stat.st_mtime)
+        response["Cache-Control"] = "no-cache"
+        patch_vary_headers(response, ("Accept-Encoding", "Cookie"))
+        return response
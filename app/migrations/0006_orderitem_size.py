@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_remove_items_image_url_itemimage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="orderitem",
+            name="size",
+            field=models.CharField(blank=True, max_length=20, null=True),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:48
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0007_stkpushrequest"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="checkout_request_id",
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="merchant_request_id",
+            field=models.CharField(blank=True, max_length=50, null=True),
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("is_paid", False)),
+                fields=["phone_number", "total_amount", "-transaction_date"],
+                name="order_unpaid_callback_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0009_mpesacallback"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="stock_status",
+            field=models.CharField(
+                blank=True,
+                choices=[
+                    ("reserved", "Reserved"),
+                    ("committed", "Committed"),
+                    ("released", "Released"),
+                ],
+                default="",
+                max_length=10,
+            ),
+        ),
+    ]
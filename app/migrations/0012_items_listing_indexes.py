@@ -0,0 +1,31 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0011_order_unpaid_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="items",
+            index=models.Index(
+                fields=["category", "id"], name="items_category_newest_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="items",
+            index=models.Index(
+                fields=["category", "price", "id"], name="items_category_price_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="items",
+            index=models.Index(
+                fields=["category", "name", "id"], name="items_category_name_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0012_items_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="items",
+            name="image_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="items",
+            name="primary_image_url",
+            field=models.URLField(blank=True, default="", editable=False),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+
+
+def populate_search_vector(apps, schema_editor):
+    # the fallback search used on other databases doesn't read the column
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    Items = apps.get_model("app", "Items")
+    Items.objects.update(
+        search_vector=SearchVector("name", weight="A", config="english")
+        + SearchVector("description", weight="B", config="english")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0013_items_image_summary"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="items",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="items",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="items_search_vector_idx"
+            ),
+        ),
+        migrations.RunPython(populate_search_vector, migrations.RunPython.noop),
+    ]
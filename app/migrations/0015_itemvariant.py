@@ -0,0 +1,67 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0014_items_search_vector"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ItemVariant",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("size", models.CharField(blank=True, default="", max_length=20)),
+                ("stock", models.IntegerField(default=0)),
+                (
+                    "price_delta",
+                    models.DecimalField(
+                        decimal_places=2,
+                        default=0,
+                        help_text="Added to the item price for this size",
+                        max_digits=10,
+                    ),
+                ),
+                (
+                    "item",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="variants",
+                        to="app.items",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["pk"],
+            },
+        ),
+        migrations.AddField(
+            model_name="orderitem",
+            name="variant",
+            field=models.ForeignKey(
+                blank=True,
+                null=True,
+                on_delete=django.db.models.deletion.SET_NULL,
+                related_name="order_items",
+                to="app.itemvariant",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="itemvariant",
+            constraint=models.UniqueConstraint(
+                fields=("item", "size"), name="itemvariant_item_size_uniq"
+            ),
+        ),
+    ]
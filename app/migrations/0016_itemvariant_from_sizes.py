@@ -0,0 +1,81 @@
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def _parse_sizes(sizes):
+    parsed = []
+    for size in (sizes or "").split(","):
+        size = size.strip()[:20]
+        if size and size not in parsed:
+            parsed.append(size)
+    return parsed or [""]
+
+
+def sizes_to_variants(apps, schema_editor):
+    """
+    Create one ItemVariant per comma-separated size (a single blank-size
+    variant for unsized items). The item's stock was shared by all of its
+    sizes, so it is split evenly between them, keeping the total unchanged.
+    """
+    Items = apps.get_model("app", "Items")
+    ItemVariant = apps.get_model("app", "ItemVariant")
+    OrderItem = apps.get_model("app", "OrderItem")
+
+    variants = []
+    for item in Items.objects.only("id", "sizes", "stock").iterator():
+        sizes = _parse_sizes(item.sizes)
+        share, remainder = divmod(max(item.stock, 0), len(sizes))
+        for position, size in enumerate(sizes):
+            variants.append(
+                ItemVariant(
+                    item_id=item.id,
+                    size=size,
+                    stock=share + (1 if position < remainder else 0),
+                )
+            )
+    ItemVariant.objects.bulk_create(variants, batch_size=BATCH_SIZE)
+
+    variant_ids = {
+        (item_id, size): pk
+        for pk, item_id, size in ItemVariant.objects.values_list(
+            "pk", "item_id", "size"
+        )
+    }
+    order_items = []
+    for order_item in OrderItem.objects.only("id", "item_id", "size").iterator():
+        variant_id = variant_ids.get((order_item.item_id, order_item.size or ""))
+        if variant_id is not None:
+            order_item.variant_id = variant_id
+            order_items.append(order_item)
+    OrderItem.objects.bulk_update(order_items, ["variant"], batch_size=BATCH_SIZE)
+
+
+def variants_to_sizes(apps, schema_editor):
+    Items = apps.get_model("app", "Items")
+    ItemVariant = apps.get_model("app", "ItemVariant")
+
+    summary = {}
+    for item_id, size, stock in ItemVariant.objects.order_by("pk").values_list(
+        "item_id", "size", "stock"
+    ):
+        sizes, total = summary.get(item_id, ([], 0))
+        if size:
+            sizes.append(size)
+        summary[item_id] = (sizes, total + stock)
+    items = list(Items.objects.filter(pk__in=summary).only("id"))
+    for item in items:
+        sizes, item.stock = summary[item.id]
+        item.sizes = ",".join(sizes)[:100]
+    Items.objects.bulk_update(items, ["sizes", "stock"], batch_size=BATCH_SIZE)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0015_itemvariant"),
+    ]
+
+    operations = [
+        migrations.RunPython(sizes_to_variants, variants_to_sizes),
+    ]
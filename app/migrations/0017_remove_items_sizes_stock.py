@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 08:57
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0016_itemvariant_from_sizes"),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name="items",
+            name="sizes",
+        ),
+        migrations.RemoveField(
+            model_name="items",
+            name="stock",
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0019_itemimage_variants"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stkpushrequest",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                    ("uncertain", "Needs reconciliation"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:32
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0020_stkpushrequest_uncertain"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="order",
+            name="order_unpaid_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="order",
+            index=models.Index(
+                condition=models.Q(("is_paid", False)),
+                fields=["stock_status", "transaction_date"],
+                name="order_unpaid_stock_date_idx",
+            ),
+        ),
+    ]
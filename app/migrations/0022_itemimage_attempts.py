@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0021_order_unpaid_stock_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="itemimage",
+            name="attempts",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="itemimage",
+            name="next_attempt_at",
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+    ]
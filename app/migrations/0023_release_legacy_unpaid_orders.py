@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def release_legacy_unpaid_orders(apps, schema_editor):
+    """
+    Orders placed before stock was reserved at checkout have no stock_status.
+    The unpaid ones never held stock, so mark them released: the sweeper then
+    purges them like any other expired order instead of skipping them forever.
+    """
+    Order = apps.get_model("app", "Order")
+    Order.objects.filter(is_paid=False, stock_status="").update(stock_status="released")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0022_itemimage_attempts"),
+    ]
+
+    operations = [
+        # the orders can't be told apart afterwards, so reversing leaves them
+        migrations.RunPython(release_legacy_unpaid_orders, migrations.RunPython.noop),
+    ]
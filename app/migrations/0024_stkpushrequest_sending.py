@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:52
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0023_release_legacy_unpaid_orders"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="stkpushrequest",
+            name="status",
+            field=models.CharField(
+                choices=[
+                    ("pending", "Pending"),
+                    ("sending", "Sending"),
+                    ("sent", "Sent"),
+                    ("failed", "Failed"),
+                    ("uncertain", "Needs reconciliation"),
+                ],
+                default="pending",
+                max_length=10,
+            ),
+        ),
+    ]
@@ -1,7 +1,14 @@
 import uuid
 
 from django.contrib.auth.models import User
-from django.db import models
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import connection, models
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .images import ResponsiveImage
 
 
 class ItemCategory(models.Model):
@@ -22,39 +29,177 @@ class Items(models.Model):
     )
     price = models.DecimalField(max_digits=10, decimal_places=2)
     description = models.TextField(default="", blank=True)
-    stock = models.IntegerField(default=0)
-    sizes = models.CharField(
-        max_length=100, blank=True, help_text="Comma-separated sizes like M,L,XL"
-    )
+    # denormalized from ItemImage so listings need not query it; kept in sync by
+    # update_image_summary (see ItemAdmin.save_model and app.signals)
+    primary_image_url = models.URLField(blank=True, default="", editable=False)
+    primary_image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    image_count = models.PositiveIntegerField(default=0, editable=False)
+    # Postgres full-text document for app.search, refreshed in save()
+    search_vector = SearchVectorField(null=True, editable=False)
 
-    def add_stock(self, amount):
-        self.stock += amount
-        self.save()
+    class Meta:
+        # keyset pagination on category pages, one per sort option
+        indexes = [
+            models.Index(fields=["category", "id"], name="items_category_newest_idx"),
+            models.Index(
+                fields=["category", "price", "id"], name="items_category_price_idx"
+            ),
+            models.Index(
+                fields=["category", "name", "id"], name="items_category_name_idx"
+            ),
+            GinIndex(fields=["search_vector"], name="items_search_vector_idx"),
+        ]
 
-    def subtract_stock(self, amount):
-        if self.stock >= amount:
-            self.stock -= amount
-            self.save()
-        else:
-            raise ValueError("Insufficient stock")
+    @staticmethod
+    def image_summary_expressions():
+        """Expressions that recompute the primary image and image_count in an UPDATE."""
+        images = ItemImage.objects.filter(item=OuterRef("pk"))
+        return {
+            "image_count": Coalesce(
+                Subquery(
+                    images.order_by()
+                    .values("item")
+                    .annotate(count=models.Count("pk"))
+                    .values("count")
+                ),
+                0,
+            ),
+            "primary_image_url": Coalesce(
+                Subquery(images.order_by("pk").values("image_url")[:1]),
+                models.Value(""),
+            ),
+            "primary_image_variants": Coalesce(
+                Subquery(images.order_by("pk").values("variants")[:1]),
+                models.Value({}, output_field=models.JSONField()),
+            ),
+        }
+
+    @staticmethod
+    def search_vector_expression():
+        # a name match ranks above a description match
+        return SearchVector("name", weight="A", config="english") + SearchVector(
+            "description", weight="B", config="english"
+        )
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        update_fields = kwargs.get("update_fields")
+        if connection.vendor == "postgresql" and (
+            update_fields is None or {"name", "description"} & set(update_fields)
+        ):
+            Items.objects.filter(pk=self.pk).update(
+                search_vector=self.search_vector_expression()
+            )
+
+    def update_image_summary(self):
+        # a single UPDATE, so the summary always matches the committed images
+        Items.objects.filter(pk=self.pk).update(**self.image_summary_expressions())
+        self.refresh_from_db(
+            fields=["primary_image_url", "primary_image_variants", "image_count"]
+        )
+
+    @property
+    def primary_image(self):
+        return ResponsiveImage(self.primary_image_url, self.primary_image_variants)
 
     def delete(self, *args, **kwargs):
         from app.supabase_utils import delete_image_from_supabase
 
         for image in self.images.all():
-            delete_image_from_supabase(image.image_url)
+            for url in [image.image_url, *image.variant_urls()]:
+                delete_image_from_supabase(url)
         super().delete(*args, **kwargs)
 
     def __str__(self):
-        return f"Item: {self.name} | Stock: {self.stock}"
+        return f"Item: {self.name}"
 
 
 class ItemImage(models.Model):
     item = models.ForeignKey(Items, related_name="images", on_delete=models.CASCADE)
     image_url = models.URLField()
+    # filled in by the process_item_images worker (see app.image_pipeline);
+    # images with no processed_at are waiting for it
+    width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    # resized copies: {"webp": {"320": url, ...}, "jpeg": {...}}
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+    processed_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # failed downloads/uploads are retried with backoff until the last attempt
+    attempts = models.PositiveSmallIntegerField(default=0, editable=False)
+    next_attempt_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # the worker's queue of unprocessed images
+            models.Index(
+                fields=["id"],
+                condition=models.Q(processed_at__isnull=True),
+                name="itemimage_unprocessed_idx",
+            ),
+        ]
+
+    @property
+    def responsive(self):
+        return ResponsiveImage(self.image_url, self.variants, self.width, self.height)
+
+    def variant_urls(self):
+        return [url for urls in self.variants.values() for url in urls.values()]
+
+
+class ItemVariant(models.Model):
+    """A purchasable size of an item; stock is tracked per variant."""
+
+    item = models.ForeignKey(Items, related_name="variants", on_delete=models.CASCADE)
+    # blank for items that come in a single size
+    size = models.CharField(max_length=20, blank=True, default="")
+    stock = models.IntegerField(default=0)
+    price_delta = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        help_text="Added to the item price for this size",
+    )
+
+    class Meta:
+        ordering = ["pk"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["item", "size"], name="itemvariant_item_size_uniq"
+            ),
+        ]
+
+    @property
+    def price(self):
+        return self.item.price + self.price_delta
+
+    # stock is changed with a single conditional UPDATE so concurrent
+    # checkouts can neither lose updates nor oversell
+    def add_stock(self, amount):
+        ItemVariant.objects.filter(pk=self.pk).update(stock=models.F("stock") + amount)
+        self.refresh_from_db(fields=["stock"])
+
+    def subtract_stock(self, amount):
+        updated = ItemVariant.objects.filter(pk=self.pk, stock__gte=amount).update(
+            stock=models.F("stock") - amount
+        )
+        if not updated:
+            raise ValueError("Insufficient stock")
+        self.refresh_from_db(fields=["stock"])
+
+    def __str__(self):
+        return f"{self.item.name} ({self.size})" if self.size else self.item.name
 
 
 class Order(models.Model):
+    STOCK_RESERVED = "reserved"
+    STOCK_COMMITTED = "committed"
+    STOCK_RELEASED = "released"
+    STOCK_STATUS_CHOICES = [
+        (STOCK_RESERVED, "Reserved"),
+        (STOCK_COMMITTED, "Committed"),
+        (STOCK_RELEASED, "Released"),
+    ]
+
     order_id = models.UUIDField(
         default=uuid.uuid4, unique=True, null=False, blank=False
     )
@@ -72,6 +217,31 @@ class Order(models.Model):
     is_delivered = models.BooleanField(default=False)
     mpesa_receipt_number = models.CharField(max_length=50, blank=True, null=True)
     transaction_date = models.DateTimeField(blank=True, null=True)
+    # IDs returned by the STK push request, echoed back in the callback
+    checkout_request_id = models.CharField(
+        max_length=50, unique=True, blank=True, null=True
+    )
+    merchant_request_id = models.CharField(max_length=50, blank=True, null=True)
+    stock_status = models.CharField(
+        max_length=10, choices=STOCK_STATUS_CHOICES, blank=True, default=""
+    )
+
+    class Meta:
+        indexes = [
+            # fallback callback match on phone + amount within a time window
+            models.Index(
+                fields=["phone_number", "total_amount", "-transaction_date"],
+                condition=models.Q(is_paid=False),
+                name="order_unpaid_callback_idx",
+            ),
+            # range scans used by the sweep_abandoned_orders command: reserved
+            # orders to expire, released ones to purge
+            models.Index(
+                fields=["stock_status", "transaction_date"],
+                condition=models.Q(is_paid=False),
+                name="order_unpaid_stock_date_idx",
+            ),
+        ]
 
     def __str__(self):
         return f"Order {self.order_id}"
@@ -85,12 +255,166 @@ class Order(models.Model):
 class OrderItem(models.Model):
     order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name="items")
     item = models.ForeignKey(Items, on_delete=models.CASCADE)
+    # null for orders placed before variants existed or whose size was deleted
+    variant = models.ForeignKey(
+        ItemVariant,
+        on_delete=models.SET_NULL,
+        related_name="order_items",
+        null=True,
+        blank=True,
+    )
     quantity = models.PositiveIntegerField()
     subtotal = models.DecimalField(max_digits=10, decimal_places=2)
+    size = models.CharField(max_length=20, blank=True, null=True)
+
+    def calculate_subtotal(self):
+        price = self.variant.price if self.variant_id else self.item.price
+        return price * self.quantity
 
     def save(self, *args, **kwargs):
-        self.subtotal = self.item.price * self.quantity
+        self.subtotal = self.calculate_subtotal()
         super().save(*args, **kwargs)
 
     def __str__(self):
         return f"{self.quantity} x {self.item.name} (Order {self.order.order_id})"
+
+
+class StkPushRequest(models.Model):
+    """A queued M-Pesa STK push for an order, sent by the run_stk_worker command."""
+
+    PENDING = "pending"
+    # claimed by a worker that is calling M-Pesa until next_attempt_at
+    SENDING = "sending"
+    SENT = "sent"
+    FAILED = "failed"
+    # the request may have reached Safaricom but its response was lost, so it
+    # is not sent again; check the M-Pesa portal before retrying by hand
+    UNCERTAIN = "uncertain"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (SENDING, "Sending"),
+        (SENT, "Sent"),
+        (FAILED, "Failed"),
+        (UNCERTAIN, "Needs reconciliation"),
+    ]
+
+    order = models.OneToOneField(
+        Order, on_delete=models.CASCADE, related_name="stk_push"
+    )
+    phone_number = models.CharField(max_length=15)
+    amount = models.DecimalField(max_digits=10, decimal_places=2)
+    account_reference = models.CharField(max_length=20)
+    transaction_desc = models.CharField(max_length=100)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default="")
+    response = models.JSONField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+
+    def __str__(self):
+        return f"STK push for Order {self.order_id} ({self.status})"
+
+
+class MpesaCallback(models.Model):
+    """
+    Append-only inbox of raw STK callbacks. mpesa_callback only inserts rows;
+    the process_mpesa_callbacks command applies them to orders.
+    """
+
+    PENDING = "pending"
+    PROCESSED = "processed"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (PROCESSED, "Processed"),
+        (FAILED, "Failed"),
+    ]
+
+    checkout_request_id = models.CharField(max_length=50, blank=True, db_index=True)
+    payload = models.JSONField()
+    received_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    processed_at = models.DateTimeField(blank=True, null=True)
+    error = models.TextField(blank=True, default="")
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="mpesacallback_pending_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Callback {self.checkout_request_id} ({self.status})"
+
+
+class Cart(models.Model):
+    """
+    A shopping cart. Logged-in users own exactly one; an anonymous visitor's
+    cart is referenced from their session and merged into the user's cart
+    on login (see cart.cart_lines).
+    """
+
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, related_name="cart", null=True, blank=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            # purge of abandoned anonymous carts
+            models.Index(
+                fields=["updated_at"],
+                condition=models.Q(user__isnull=True),
+                name="cart_anonymous_updated_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"Cart {self.pk} ({self.user or 'anonymous'})"
+
+
+class CartLine(models.Model):
+    cart = models.ForeignKey(Cart, on_delete=models.CASCADE, related_name="lines")
+    variant = models.ForeignKey(
+        ItemVariant, on_delete=models.CASCADE, related_name="cart_lines"
+    )
+    quantity = models.PositiveIntegerField()
+
+    class Meta:
+        # one row per size of an item; the target of the quantity upserts
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cart", "variant"], name="cartline_cart_variant_uniq"
+            ),
+        ]
+
+    @property
+    def item(self):
+        return self.variant.item
+
+    @property
+    def size(self):
+        return self.variant.size or None
+
+    @property
+    def amount(self):
+        return self.variant.price * self.quantity
+
+    @property
+    def image_url(self):
+        # denormalized on the item, so the cart never touches ItemImage
+        return self.item.primary_image.thumbnail or None
+
+    def __str__(self):
+        return f"{self.quantity} x {self.variant}"
@@ -0,0 +1,90 @@
+import hashlib
+from functools import wraps
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import (
+    get_conditional_response,
+    patch_cache_control,
+    patch_vary_headers,
+)
+from django.utils.http import http_date
+
+from .catalog import get_catalog_version
+
+CATALOG_PAGE_KEY = "catalog:page:{version}:{path}"
+# a catalog edit switches every page to a new key at once; the timeout bounds
+# how stale stock shown on a cached page can get, since checkout reserves
+# stock without bumping the catalog version
+CATALOG_PAGE_TIMEOUT = 5 * 60
+
+
+def _is_cacheable(request):
+    # pages for logged-in users carry their cart, forms and CSRF tokens, and a
+    # pending flash message would be cached for everyone
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _add_validators(response, etag, last_modified):
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(last_modified)
+    # browsers must revalidate, so a visitor who logs in never sees a stale
+    # anonymous page; the 304 keeps that revalidation cheap
+    patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def cache_catalog_page(view):
+    """
+    Serve anonymous visitors a cached copy of the page, keyed by the full URL
+    and the catalog version, with a strong ETag and Last-Modified. A matching
+    If-None-Match/If-Modified-Since is answered with a 304 before the view
+    runs. Logged-in users always get a freshly rendered page.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not _is_cacheable(request):
+            return view(request, *args, **kwargs)
+
+        version = get_catalog_version()
+        path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+        key = CATALOG_PAGE_KEY.format(version=version, path=path)
+        entry = cache.get(key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200 or response.streaming:
+                return response
+            content = response.content
+            entry = {
+                "content": content,
+                "content_type": response["Content-Type"],
+                "etag": f'"{hashlib.md5(content).hexdigest()}"',
+                # the version is the time_ns of the last catalog change
+                "last_modified": version // 1_000_000_000,
+            }
+            cache.set(key, entry, CATALOG_PAGE_TIMEOUT)
+        else:
+            response = None
+
+        # an unchanged page keeps its ETag across catalog versions, so a
+        # conditional request can still get a 304 right after a re-render
+        response = get_conditional_response(
+            request,
+            etag=entry["etag"],
+            last_modified=entry["last_modified"],
+            response=response,
+        )
+        if response is None:
+            response = HttpResponse(
+                entry["content"], content_type=entry["content_type"]
+            )
+        return _add_validators(response, entry["etag"], entry["last_modified"])
+
+    return wrapper
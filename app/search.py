@@ -0,0 +1,118 @@
+import bisect
+import re
+
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from django.core.paginator import Paginator
+from django.db import connection
+from django.db.models import F
+
+from .catalog import get_catalog_version
+from .models import Items
+
+RESULTS_PER_PAGE = 24
+MAX_QUERY_LENGTH = 100
+
+# same relative weights as Postgres' defaults for the A (name) and B
+# (description) labels used by Items.search_vector_expression
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+_TOKEN_RE = re.compile(r"\w+")
+
+# per-process memo of the last (version, InvertedIndex) pair built by this worker
+_index_memo = (None, None)
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+class InvertedIndex:
+    """
+    In-memory token -> {item_id: score} index used when the database has no
+    full-text search (SQLite in development and test runs). Every query term
+    must match, as a prefix of some indexed token, for an item to be returned.
+    """
+
+    def __init__(self, rows):
+        self.postings = {}
+        for item_id, name, description in rows:
+            self._add(item_id, name, NAME_WEIGHT)
+            self._add(item_id, description, DESCRIPTION_WEIGHT)
+        self.vocabulary = sorted(self.postings)
+
+    def _add(self, item_id, text, weight):
+        for token in tokenize(text or ""):
+            scores = self.postings.setdefault(token, {})
+            scores[item_id] = scores.get(item_id, 0) + weight
+
+    def _term_scores(self, term):
+        scores = {}
+        start = bisect.bisect_left(self.vocabulary, term)
+        for token in self.vocabulary[start:]:
+            if not token.startswith(term):
+                break
+            for item_id, score in self.postings[token].items():
+                scores[item_id] = scores.get(item_id, 0) + score
+        return scores
+
+    def search(self, query):
+        """Return the ids of the items matching every term, best match first."""
+        scores = None
+        for term in dict.fromkeys(tokenize(query)):
+            term_scores = self._term_scores(term)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    item_id: score + term_scores[item_id]
+                    for item_id, score in scores.items()
+                    if item_id in term_scores
+                }
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        return sorted(scores, key=lambda item_id: (-scores[item_id], item_id))
+
+
+def get_fallback_index():
+    """
+    Return the InvertedIndex for the current catalog version, rebuilding it
+    (one query) after any item is saved or deleted.
+    """
+    global _index_memo
+    version = get_catalog_version()
+    memo_version, index = _index_memo
+    if memo_version != version:
+        index = InvertedIndex(
+            Items.objects.values_list("id", "name", "description").iterator()
+        )
+        _index_memo = (version, index)
+    return index
+
+
+def search_items(query, page_number=1, per_page=RESULTS_PER_PAGE):
+    """
+    Return a Page of items matching `query`, ranked by relevance. Postgres
+    uses the GIN-indexed Items.search_vector; other databases fall back to
+    the in-process InvertedIndex.
+    """
+    query = (query or "").strip()[:MAX_QUERY_LENGTH]
+    if not tokenize(query):
+        return Paginator(Items.objects.none(), per_page).get_page(1)
+
+    if connection.vendor == "postgresql":
+        search_query = SearchQuery(query, search_type="websearch", config="english")
+        results = (
+            Items.objects.filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .defer("search_vector")
+            .order_by("-rank", "id")
+        )
+        return Paginator(results, per_page).get_page(page_number)
+
+    page = Paginator(get_fallback_index().search(query), per_page).get_page(page_number)
+    items = Items.objects.defer("search_vector").in_bulk(page.object_list)
+    page.object_list = [items[pk] for pk in page.object_list if pk in items]
+    return page
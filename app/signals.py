@@ -0,0 +1,74 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .catalog import bump_catalog_version
+from .facets import invalidate_facet_index
+from .models import ItemCategory, ItemImage, Items, ItemVariant
+from .snapshots import schedule_snapshot
+
+
+def _item_category_id(item_id):
+    return (
+        Items.objects.filter(pk=item_id).values_list("category_id", flat=True).first()
+    )
+
+
+@receiver(post_save, sender=Items)
+@receiver(post_delete, sender=Items)
+@receiver(post_save, sender=ItemImage)
+@receiver(post_delete, sender=ItemImage)
+@receiver(post_save, sender=ItemVariant)
+@receiver(post_delete, sender=ItemVariant)
+@receiver(post_save, sender=ItemCategory)
+@receiver(post_delete, sender=ItemCategory)
+def invalidate_catalog_cache(sender, **kwargs):
+    bump_catalog_version()
+
+
+@receiver(post_delete, sender=ItemImage)
+def update_item_image_summary(sender, instance, **kwargs):
+    # no-op when the image is deleted along with its item
+    Items.objects.filter(pk=instance.item_id).update(
+        **Items.image_summary_expressions()
+    )
+
+
+@receiver(pre_save, sender=Items)
+def refresh_previous_category(sender, instance, **kwargs):
+    # an item moved to another category also changes the one it left
+    if instance.pk is None:
+        return
+    previous = _item_category_id(instance.pk)
+    if previous is not None and previous != instance.category_id:
+        invalidate_facet_index(previous)
+        schedule_snapshot([previous])
+
+
+@receiver(post_save, sender=Items)
+@receiver(post_delete, sender=Items)
+def refresh_item_category(sender, instance, **kwargs):
+    invalidate_facet_index(instance.category_id)
+    schedule_snapshot([instance.category_id])
+
+
+@receiver(post_save, sender=ItemVariant)
+@receiver(post_delete, sender=ItemVariant)
+def refresh_variant_category(sender, instance, **kwargs):
+    category_id = _item_category_id(instance.item_id)
+    invalidate_facet_index(category_id)
+    schedule_snapshot([category_id])
+
+
+@receiver(post_save, sender=ItemImage)
+@receiver(post_delete, sender=ItemImage)
+def refresh_image_category(sender, instance, **kwargs):
+    if settings.CATALOG_SNAPSHOTS_ENABLED:
+        schedule_snapshot([_item_category_id(instance.item_id)])
+
+
+@receiver(post_save, sender=ItemCategory)
+@receiver(post_delete, sender=ItemCategory)
+def refresh_all_snapshots(sender, **kwargs):
+    # category names and thumbnails appear in the navbar of every page
+    schedule_snapshot()
@@ -0,0 +1,174 @@
+import gzip
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from importlib import import_module
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.storage import default_storage
+from django.db import transaction
+from django.http import HttpRequest
+from django.urls import reverse
+
+from .models import ItemCategory
+
+try:
+    import brotli
+except ImportError:  # optional: only gzip copies are written without it
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = "index.html"
+
+# category ids (None meaning "everything") waiting for the current transaction
+_pending = threading.local()
+
+
+def snapshot_root():
+    return Path(settings.CATALOG_SNAPSHOT_ROOT)
+
+
+def home_snapshot_path():
+    return snapshot_root() / SNAPSHOT_FILE
+
+
+def category_snapshot_path(category_id):
+    return snapshot_root() / "category" / str(category_id) / SNAPSHOT_FILE
+
+
+def _anonymous_request(path):
+    """A bare GET request as an anonymous visitor with an empty session."""
+    request = HttpRequest()
+    request.method = "GET"
+    request.path = request.path_info = path
+    request.META = {
+        "SERVER_NAME": settings.ALLOWED_HOSTS[0],
+        "SERVER_PORT": "443",
+        "HTTP_HOST": settings.ALLOWED_HOSTS[0],
+    }
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request.user = AnonymousUser()
+    request._messages = default_storage(request)
+    return request
+
+
+def _render(view, path, **kwargs):
+    response = view(_anonymous_request(path), **kwargs)
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+def _write_atomic(path, content):
+    # readers never see a half-written file: write alongside, then rename
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=".tmp-")
+    with os.fdopen(fd, "wb") as f:
+        f.write(content)
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, path)
+
+
+def _write_snapshot(path, content):
+    """Write the page plus its precompressed .gz (and .br) siblings."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if brotli is not None:
+        _write_atomic(path.with_name(path.name + ".br"), brotli.compress(content))
+    _write_atomic(path.with_name(path.name + ".gz"), gzip.compress(content, mtime=0))
+    # the plain file last, as the fast path looks for it first
+    _write_atomic(path, content)
+
+
+def snapshot_home():
+    from .views import home
+
+    content = _render(home, reverse("store-home"))
+    if content is not None:
+        _write_snapshot(home_snapshot_path(), content)
+
+
+def snapshot_category(category_id):
+    from .views import category_items
+
+    content = _render(
+        category_items,
+        reverse("category_items", args=[category_id]),
+        category_id=category_id,
+    )
+    if content is None:
+        # the category is gone (404): stop serving its snapshot
+        shutil.rmtree(category_snapshot_path(category_id).parent, ignore_errors=True)
+    else:
+        _write_snapshot(category_snapshot_path(category_id), content)
+
+
+def build_snapshots(category_ids=None):
+    """
+    Re-render the home page and the first page of the given categories, or
+    of every category (dropping snapshots of deleted ones) when None.
+    Returns the number of category pages processed.
+    """
+    if category_ids is None:
+        category_ids = set(ItemCategory.objects.values_list("id", flat=True))
+        category_dir = snapshot_root() / "category"
+        if category_dir.is_dir():
+            for entry in category_dir.iterdir():
+                if not entry.name.isdigit() or int(entry.name) not in category_ids:
+                    shutil.rmtree(entry, ignore_errors=True)
+    snapshot_home()
+    for category_id in sorted(category_ids):
+        snapshot_category(category_id)
+    return len(category_ids)
+
+
+def refresh_stale_snapshots(max_age):
+    """
+    Re-render every snapshot if the home page's is missing or older than
+    `max_age` seconds. Stock is reserved and released with bulk UPDATEs that
+    send no signals, so only this keeps stock counts on snapshots current.
+    Returns the number of category pages rebuilt, or None if still fresh.
+    """
+    try:
+        age = time.time() - home_snapshot_path().stat().st_mtime
+    except FileNotFoundError:
+        age = None
+    if age is not None and age < max_age:
+        return None
+    return build_snapshots()
+
+
+def _flush_pending():
+    pending = getattr(_pending, "category_ids", set())
+    if not pending:
+        return
+    _pending.category_ids = set()
+    try:
+        build_snapshots(None if None in pending else pending - {None})
+    except Exception:
+        # a failed snapshot must not break the admin save that triggered it;
+        # the dynamic pages are still served until the next successful run
+        logger.exception("Catalog snapshot regeneration failed")
+
+
+def schedule_snapshot(category_ids=None):
+    """
+    Re-render the snapshots of `category_ids` (every page when None) once the
+    current transaction commits, batching all changes made within it.
+    """
+    if not settings.CATALOG_SNAPSHOTS_ENABLED:
+        return
+    pending = getattr(_pending, "category_ids", None)
+    if pending is None:
+        pending = _pending.category_ids = set()
+    if category_ids is None:
+        pending.add(None)
+    else:
+        pending.update(pk for pk in category_ids if pk is not None)
+    # flushing is idempotent, so extra callbacks from the same transaction
+    # (or a rolled-back one) are harmless no-ops
+    transaction.on_commit(_flush_pending)
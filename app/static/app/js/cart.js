@@ -0,0 +1,83 @@
+// Progressive cart forms: a form with data-cart-api is posted to the JSON
+// cart endpoint and the page is patched in place from the response. Without
+// JavaScript, or if the endpoint answers with anything but JSON, the form is
+// submitted normally.
+(function () {
+  function setText(root, selector, text) {
+    root.querySelectorAll(selector).forEach(function (el) {
+      el.textContent = text;
+    });
+  }
+
+  function showFeedback(form, message, isError) {
+    var feedback = form.querySelector("[data-cart-feedback]");
+    if (!feedback) {
+      if (isError) window.alert(message);
+      return;
+    }
+    feedback.textContent = message;
+    feedback.classList.toggle("text-danger", isError);
+    feedback.classList.toggle("text-success", !isError);
+  }
+
+  function updateBadge(count) {
+    var badge = document.getElementById("cart-count");
+    if (!badge) return;
+    badge.textContent = count;
+    badge.classList.toggle("d-none", !count);
+  }
+
+  function updateCart(form, data) {
+    var line = data.line;
+    var entry = document.querySelector('[data-cart-line="' + line.variant_id + '"]');
+    if (entry) {
+      if (line.quantity) {
+        setText(entry, "[data-cart-quantity]", line.quantity);
+        setText(entry, "[data-cart-amount]", line.amount);
+        // keep the fallback forms in step with the new quantity
+        entry.querySelectorAll('input[name="quantity"]').forEach(function (input) {
+          input.value = line.quantity;
+        });
+      } else {
+        entry.remove();
+      }
+    }
+    setText(document, "[data-cart-total]", data.total);
+    updateBadge(data.count);
+    if (!data.count && document.querySelector("[data-cart-total]")) {
+      // the emptied cart page shows its "empty" state
+      window.location.reload();
+    }
+  }
+
+  document.addEventListener("submit", function (event) {
+    var form = event.target;
+    var url = form.dataset.cartApi;
+    if (!url) return;
+    event.preventDefault();
+
+    var body = new FormData(form);
+    if (form.dataset.cartAction) body.set("action", form.dataset.cartAction);
+    fetch(url, {
+      method: "POST",
+      body: body,
+      credentials: "same-origin",
+      headers: { Accept: "application/json", "X-Requested-With": "XMLHttpRequest" },
+    })
+      .then(function (response) {
+        var type = response.headers.get("Content-Type") || "";
+        if (type.indexOf("application/json") === -1) throw new Error(response.status);
+        return response.json().then(function (data) {
+          if (!response.ok) {
+            showFeedback(form, data.error, true);
+            return;
+          }
+          updateCart(form, data);
+          showFeedback(form, form.dataset.cartDone || "", false);
+        });
+      })
+      .catch(function () {
+        form.submit();
+      });
+  });
+})();
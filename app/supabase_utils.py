@@ -1,6 +1,7 @@
 import os
 import uuid
-from urllib.parse import unquote, urlparse
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, unquote, urlparse
 
 from dotenv import load_dotenv
 from supabase import create_client
@@ -10,6 +11,8 @@ load_dotenv()
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 SUPABASE_BUCKET = os.getenv("SUPABASE_BUCKET", "ecommerce-bucket")
+# most uploads in flight at once when saving several images
+SUPABASE_UPLOAD_WORKERS = int(os.getenv("SUPABASE_UPLOAD_WORKERS", "4"))
 
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise RuntimeError("SUPABASE_URL and SUPABASE_KEY must be set in environment")
@@ -17,9 +20,23 @@ if not SUPABASE_URL or not SUPABASE_KEY:
 supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
 
 
-def upload_image_to_supabase(file, filename: str | None = None) -> str:
+def public_url(path: str) -> str:
     """
-    Upload a Django UploadedFile or file-like object to Supabase storage.
+    Public URL of an object in the bucket. Built locally: public objects
+    live at a fixed address, so there is no need to ask the storage API.
+    """
+    return (
+        f"{SUPABASE_URL.rstrip('/')}/storage/v1/object/public/"
+        f"{SUPABASE_BUCKET}/{quote(path.lstrip('/'))}"
+    )
+
+
+def upload_image_to_supabase(
+    file, filename: str | None = None, upsert: bool = False
+) -> str:
+    """
+    Upload a Django UploadedFile or file-like object to Supabase storage,
+    replacing an existing object at the same path if `upsert` is set.
     Returns the public URL string.
     Raises RuntimeError on failure.
     """
@@ -27,59 +44,88 @@ def upload_image_to_supabase(file, filename: str | None = None) -> str:
         filename = f"{uuid.uuid4().hex}_{getattr(file, 'name', 'upload')}"
     path = filename.lstrip("/")
 
-    # accept UploadedFile or file-like
-    file_obj = getattr(file, "file", file)
-    try:
-        file_obj.seek(0)
-    except Exception:
-        pass
-    data = file_obj.read()
-    if isinstance(data, str):
-        data = data.encode()
+    if hasattr(file, "temporary_file_path"):
+        # large uploads are already on disk: let the client stream the file
+        data = file.temporary_file_path()
+    else:
+        # accept UploadedFile or file-like
+        file_obj = getattr(file, "file", file)
+        try:
+            file_obj.seek(0)
+        except Exception:
+            pass
+        data = file_obj.read()
+        if isinstance(data, str):
+            data = data.encode()
 
     content_type = getattr(file, "content_type", "application/octet-stream")
 
-    res = supabase.storage.from_(SUPABASE_BUCKET).upload(
-        path, data, {"content-type": content_type}
-    )
+    options = {"content-type": content_type}
+    if upsert:
+        options["upsert"] = "true"
+    res = supabase.storage.from_(SUPABASE_BUCKET).upload(path, data, options)
     # supabase-py may return dict with 'error'
     if isinstance(res, dict) and res.get("error"):
         raise RuntimeError(f"Supabase upload error: {res['error']}")
 
-    pub = supabase.storage.from_(SUPABASE_BUCKET).get_public_url(path)
-    if isinstance(pub, dict):
-        url = pub.get("publicURL") or pub.get("public_url")
-    else:
-        url = pub
-
-    if not url:
-        raise RuntimeError("Failed to obtain public URL after upload")
-
-    return url
+    return public_url(path)
 
 
-def delete_image_from_supabase(public_url: str) -> bool:
+def upload_images_to_supabase(
+    uploads, max_workers: int | None = None, upsert: bool = False
+):
     """
-    Delete a file from Supabase given its public URL (or storage path).
-    Returns True if removed (or no-op), False on error.
+    Upload several (file, filename) pairs concurrently, at most
+    `max_workers` (SUPABASE_UPLOAD_WORKERS) at a time. Returns one
+    (file, public_url, error) tuple per upload in the given order, where
+    exactly one of public_url and error is None, so a failed file doesn't
+    stop the others.
     """
-    if not public_url:
-        return False
+    uploads = list(uploads)
+    if not uploads:
+        return []
+
+    def upload(pair):
+        file, filename = pair
+        try:
+            return file, upload_image_to_supabase(file, filename, upsert), None
+        except Exception as e:
+            return file, None, e
+
+    workers = min(max_workers or SUPABASE_UPLOAD_WORKERS, len(uploads))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(upload, uploads))
+
 
+def storage_path(public_url: str) -> str:
+    """The path inside the bucket of a public URL (or of a storage path)."""
     # try to extract storage path after the bucket name
     try:
         parsed = urlparse(public_url)
         path = unquote(parsed.path)
         marker = f"/{SUPABASE_BUCKET}/"
         if marker in path:
-            storage_path = path.split(marker, 1)[1]
-        else:
-            # fallback to basename
-            storage_path = os.path.basename(path)
+            return path.split(marker, 1)[1]
+        # fallback to basename
+        return os.path.basename(path)
     except Exception:
-        storage_path = os.path.basename(public_url)
+        return os.path.basename(public_url)
+
+
+def download_image_from_supabase(public_url: str) -> bytes:
+    """Fetch the contents of a stored file given its public URL."""
+    return supabase.storage.from_(SUPABASE_BUCKET).download(storage_path(public_url))
+
+
+def delete_image_from_supabase(public_url: str) -> bool:
+    """
+    Delete a file from Supabase given its public URL (or storage path).
+    Returns True if removed (or no-op), False on error.
+    """
+    if not public_url:
+        return False
 
-    res = supabase.storage.from_(SUPABASE_BUCKET).remove([storage_path])
+    res = supabase.storage.from_(SUPABASE_BUCKET).remove([storage_path(public_url)])
     # check for error key
     if isinstance(res, dict) and res.get("error"):
         return False
@@ -0,0 +1,164 @@
+import threading
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import (
+    TestCase,
+    TransactionTestCase,
+    override_settings,
+    skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from . import catalog
+from .inventory import InsufficientStock, reserve_stock, restock
+from .listing import PAGE_SIZE
+from .models import ItemCategory, ItemImage, Items, ItemVariant
+from .views import CARD_IMAGE_LIMIT
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CATALOG_SNAPSHOTS_ENABLED=False,
+)
+class HomeQueryCountTests(TestCase):
+    def add_categories(self, count):
+        for _ in range(count):
+            number = ItemCategory.objects.count() + 1
+            category = ItemCategory.objects.create(category=f"Category {number}")
+            Items.objects.create(
+                name=f"Item {number}",
+                category=category,
+                price=10,
+                primary_image_url=f"https://example.com/{number}.jpg",
+                image_count=1,
+            )
+
+    def get_home(self):
+        # start cold so the category thumbnails are loaded from the database
+        cache.clear()
+        catalog._thumbnails_memo = (None, None)
+        response = self.client.get(reverse("store-home"))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_query_count_does_not_grow_with_categories(self):
+        self.add_categories(1)
+        with CaptureQueriesContext(connection) as one_category:
+            self.get_home()
+
+        self.add_categories(9)
+        with self.assertNumQueries(len(one_category)):
+            response = self.get_home()
+        self.assertEqual(len(response.context["categories"]), 10)
+        self.assertContains(response, "https://example.com/10.jpg")
+
+
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CATALOG_SNAPSHOTS_ENABLED=False,
+)
+class CategoryPageQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = ItemCategory.objects.create(category="Jerseys")
+        # a full first page and a short second one, every item with more
+        # images than a card shows
+        image_count = CARD_IMAGE_LIMIT + 2
+        for number in range(PAGE_SIZE + 6):
+            item = Items.objects.create(
+                name=f"Jersey {number}",
+                category=cls.category,
+                price=10 + number,
+                primary_image_url=f"https://example.com/{number}-0.jpg",
+                image_count=image_count,
+            )
+            ItemVariant.objects.create(item=item, size="M", stock=number % 3)
+            ItemImage.objects.bulk_create(
+                ItemImage(item=item, image_url=f"https://example.com/{number}-{i}.jpg")
+                for i in range(image_count)
+            )
+
+    def get_page(self, **params):
+        # start cold so neither the page nor its facet index comes from the cache
+        cache.clear()
+        response = self.client.get(
+            reverse("category_items", args=[self.category.id]), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_cursor_page_costs_the_same_as_the_first(self):
+        with CaptureQueriesContext(connection) as first_page:
+            response = self.get_page(sort="price")
+        items = response.context["items"]
+        self.assertEqual(len(items), PAGE_SIZE)
+        self.assertTrue(all(len(i.card_images) == CARD_IMAGE_LIMIT for i in items))
+
+        with self.assertNumQueries(len(first_page)):
+            response = self.get_page(
+                sort="price", after=response.context["next_cursor"]
+            )
+        self.assertEqual(len(response.context["items"]), 6)
+        self.assertIsNone(response.context["next_cursor"])
+
+
+class ReserveStockTests(TestCase):
+    def setUp(self):
+        item = Items.objects.create(name="Jersey", price=50)
+        self.small = ItemVariant.objects.create(item=item, size="S", stock=5)
+        self.large = ItemVariant.objects.create(item=item, size="L", stock=1)
+
+    def assertStock(self, small, large):
+        self.small.refresh_from_db()
+        self.large.refresh_from_db()
+        self.assertEqual((self.small.stock, self.large.stock), (small, large))
+
+    def test_last_unit_is_reserved_once(self):
+        reserve_stock({self.large.pk: 1})
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock({self.large.pk: 1})
+        self.assertEqual(raised.exception.variants, [self.large])
+        self.assertStock(5, 0)
+
+    def test_short_line_reserves_nothing(self):
+        with self.assertRaises(InsufficientStock) as raised:
+            reserve_stock({self.small.pk: 2, self.large.pk: 2})
+        self.assertEqual(raised.exception.variants, [self.large])
+        self.assertStock(5, 1)
+
+    def test_restock_puts_quantities_back(self):
+        reserve_stock({self.small.pk: 2, self.large.pk: 1})
+        restock({self.small.pk: 2, self.large.pk: 1})
+        self.assertStock(5, 1)
+
+
+class ReserveStockRaceTests(TransactionTestCase):
+    # SQLite serializes writers on the whole database, so only a database
+    # with row locks (Postgres) actually races the two UPDATEs
+    @skipUnlessDBFeature("has_select_for_update")
+    def test_concurrent_reservations_of_last_unit(self):
+        item = Items.objects.create(name="Jersey", price=50)
+        variant = ItemVariant.objects.create(item=item, size="L", stock=1)
+        barrier = threading.Barrier(2)
+        outcomes = []
+
+        def reserve():
+            try:
+                barrier.wait()
+                reserve_stock({variant.pk: 1})
+                outcomes.append("reserved")
+            except InsufficientStock:
+                outcomes.append("insufficient")
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=reserve) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(outcomes), ["insufficient", "reserved"])
+        variant.refresh_from_db()
+        self.assertEqual(variant.stock, 0)
@@ -26,6 +26,8 @@ urlpatterns = [
         "category/<int:category_id>/", user_views.category_items, name="category_items"
     ),
     path("item/<int:item_id>/", user_views.item_details, name="item_details"),
+    path("search/", user_views.search, name="search"),
+    path("api/search/", user_views.search_api, name="search_api"),
 ]
 
 
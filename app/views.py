@@ -2,11 +2,22 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.contrib.auth.views import LoginView, LogoutView
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Prefetch, prefetch_related_objects
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, redirect, render, reverse
+from django.utils.http import urlencode
 from django.utils.timezone import localtime
 
+from app.catalog import get_category_thumbnails
+from app.facets import PRICE_LABELS, PRICE_RANGES, get_facet_index
 from app.forms import UserModelForm
-from app.models import ItemCategory, Items, Order
+from app.listing import DEFAULT_SORT, SORT_LABELS, SORT_OPTIONS, keyset_page
+from app.models import ItemCategory, ItemImage, Items, Order
+from app.page_cache import cache_catalog_page
+from app.search import search_items
+
+# images rendered in each item card's carousel on category pages
+CARD_IMAGE_LIMIT = 5
 
 
 def sign_up(request):
@@ -58,39 +69,114 @@ class CustomLoginView(LoginView):
         return context
 
 
+@cache_catalog_page
 def home(request):
-    categories = ItemCategory.objects.all()
-    category_images = {}
-    for category in categories:
-        first_item = category.items.first()
-        # use the first image of the first item if available, otherwise use a default
-        if first_item and first_item.images.exists():
-            first_image_url = first_item.images.first().image_url
-        else:
-            first_image_url = "images/default.jpg"
-        category_images[category.id] = first_image_url
+    # shared with the navbar context processor, so this is computed once per request
+    categories, category_images = get_category_thumbnails(request)
     context = {"categories": categories, "category_images": category_images}
     return render(request, "app_templates/home.html", context)
 
 
+@cache_catalog_page
 def category_items(request, category_id):
     category = get_object_or_404(ItemCategory, id=category_id)
+    sort = request.GET.get("sort", DEFAULT_SORT)
+    if sort not in SORT_OPTIONS:
+        sort = DEFAULT_SORT
+    # facet filters are resolved against the category's cached bitmap index
+    facet_index = get_facet_index(category.id)
+    sizes = [size for size in request.GET.getlist("size") if size in facet_index.sizes]
+    price = request.GET.get("price")
+    if price not in PRICE_RANGES:
+        price = None
+    in_stock = request.GET.get("in_stock") == "1"
     items = category.items.all()
+    if sizes or price or in_stock:
+        items = items.filter(id__in=facet_index.filter(sizes, price, in_stock))
+    filter_query = urlencode(
+        {"size": sizes, "price": price or [], "in_stock": "1" if in_stock else []},
+        doseq=True,
+    )
+    items, next_cursor = keyset_page(items, sort, request.GET.get("after"))
+    # single-image cards render from Items.primary_image; only items with a
+    # carousel need their images, and only the first few of them
+    prefetch_related_objects(
+        [item for item in items if item.image_count > 1],
+        Prefetch(
+            "images",
+            queryset=ItemImage.objects.order_by("id")[:CARD_IMAGE_LIMIT],
+            to_attr="card_images",
+        ),
+    )
     return render(
         request,
         "app_templates/category_items.html",
-        {"items": items, "category": category},
+        {
+            "items": items,
+            "category": category,
+            "sort": sort,
+            "sort_labels": SORT_LABELS,
+            "next_cursor": next_cursor,
+            "is_first_page": "after" not in request.GET,
+            "facet_counts": facet_index.counts(sizes, price, in_stock),
+            "price_labels": PRICE_LABELS,
+            "selected_sizes": sizes,
+            "selected_price": price,
+            "in_stock": in_stock,
+            "filter_query": filter_query,
+        },
     )
 
 
+def search(request):
+    query = request.GET.get("q", "").strip()
+    page = search_items(query, request.GET.get("page"))
+    return render(
+        request,
+        "app_templates/search.html",
+        {"query": query, "page": page, "items": page.object_list},
+    )
+
+
+def search_api(request):
+    page = search_items(request.GET.get("q", ""), request.GET.get("page"))
+    return JsonResponse(
+        {
+            "count": page.paginator.count,
+            "page": page.number,
+            "num_pages": page.paginator.num_pages,
+            "results": [
+                {
+                    "id": item.id,
+                    "name": item.name,
+                    "price": str(item.price),
+                    "url": reverse("item_details", args=[item.id]),
+                    "image_url": item.primary_image.src or None,
+                }
+                for item in page.object_list
+            ],
+        }
+    )
+
+
+@cache_catalog_page
 def item_details(request, item_id):
-    item = get_object_or_404(Items.objects.prefetch_related("images"), id=item_id)
-    cart = request.session.get("cart", {})
-    selected_sizes = request.session.get("selected_sizes", {})
+    item = get_object_or_404(
+        Items.objects.prefetch_related("images", "variants"), id=item_id
+    )
+    variants = list(item.variants.all())
+    selected_variant = request.session.get("selected_variants", {}).get(str(item.id))
     return render(
         request,
         "app_templates/item_details.html",
-        {"item": item, "cart": cart, "selected_sizes": selected_sizes},
+        {
+            "item": item,
+            "variants": variants,
+            # single-size items get their only variant as a hidden field
+            "sized": len(variants) > 1 or any(v.size for v in variants),
+            "max_quantity": max((v.stock for v in variants), default=0),
+            "selected_variant": selected_variant,
+        },
     )
 
 
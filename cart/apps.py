@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class CartConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "cart"
+
+    def ready(self):
+        # connect the merge of anonymous carts on login
+        from . import signals  # noqa: F401
@@ -0,0 +1,245 @@
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from app.models import Cart, CartLine, ItemVariant
+
+# session key holding an anonymous visitor's Cart id; it survives the
+# session key rotation at login, which is when the cart is merged
+CART_SESSION_KEY = "cart_id"
+# the session dict cart used before carts were stored in the database; its
+# keys are item ids ("12" or "12:M"), never variant ids
+LEGACY_CART_SESSION_KEY = "cart"
+# the sizes chosen per item id, which went with the legacy cart
+LEGACY_SIZES_SESSION_KEY = "selected_sizes"
+
+
+def _upsert_increment(select_sql, params):
+    """
+    INSERT the (cart_id, variant_id, quantity) rows produced by `select_sql`,
+    adding the quantity onto lines that already exist, in one statement.
+    """
+    qn = connection.ops.quote_name
+    table = qn(CartLine._meta.db_table)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} ({qn('cart_id')}, {qn('variant_id')}, {qn('quantity')}) "
+            f"{select_sql} "
+            f"ON CONFLICT ({qn('cart_id')}, {qn('variant_id')}) "
+            f"DO UPDATE SET {qn('quantity')} = {table}.{qn('quantity')} + "
+            f"excluded.{qn('quantity')}",
+            params,
+        )
+
+
+def _touch(cart):
+    # only anonymous carts are purged by age, so only they need the timestamp
+    if cart.user_id is None:
+        Cart.objects.filter(pk=cart.pk).update(updated_at=timezone.now())
+
+
+def add_line_quantity(cart, variant_id, quantity):
+    """Add `quantity` of a variant to the cart (creating the line if needed)."""
+    _upsert_increment("SELECT %s, %s, %s", [cart.pk, variant_id, quantity])
+    _touch(cart)
+
+
+def set_line_quantity(cart, variant_id, quantity):
+    """Set a line's quantity in one upsert; zero or less removes the line."""
+    if quantity <= 0:
+        remove_line(cart, variant_id)
+        return
+    CartLine.objects.bulk_create(
+        [CartLine(cart=cart, variant_id=variant_id, quantity=quantity)],
+        update_conflicts=True,
+        unique_fields=["cart", "variant"],
+        update_fields=["quantity"],
+    )
+    _touch(cart)
+
+
+def decrement_line(cart, variant_id):
+    """
+    Take one off a line with a conditional UPDATE, removing the line at zero,
+    so concurrent decrements each count.
+    """
+    lines = CartLine.objects.filter(cart=cart, variant_id=variant_id)
+    if not lines.filter(quantity__gt=1).update(quantity=F("quantity") - 1):
+        lines.filter(quantity__lte=1).delete()
+    _touch(cart)
+
+
+def line_quantity(cart, variant_id):
+    line = CartLine.objects.filter(cart=cart, variant_id=variant_id)
+    return line.values_list("quantity", flat=True).first() or 0
+
+
+def remove_line(cart, variant_id):
+    CartLine.objects.filter(cart=cart, variant_id=variant_id).delete()
+
+
+def remove_lines(lines):
+    # only the given lines: anything added meanwhile stays in the cart
+    CartLine.objects.filter(pk__in=[line.pk for line in lines]).delete()
+
+
+def merge_carts(source, target):
+    """Move every line of `source` into `target` with one upsert, then drop `source`."""
+    qn = connection.ops.quote_name
+    with transaction.atomic():
+        _upsert_increment(
+            f"SELECT %s, {qn('variant_id')}, {qn('quantity')} "
+            f"FROM {qn(CartLine._meta.db_table)} WHERE {qn('cart_id')} = %s",
+            [target.pk, source.pk],
+        )
+        source.delete()
+
+
+def _import_legacy_cart(request, cart):
+    """
+    Move the legacy session cart into `cart`. Its keys name an item and a
+    size ("12" or "12:M"), so each is mapped to the item's variant of that
+    size in one query; a bare "12" is an item id, never a variant id. Keys
+    whose item or size no longer exists are dropped.
+    """
+    legacy = request.session.pop(LEGACY_CART_SESSION_KEY, None) or {}
+    quantities = {}
+    for key, quantity in legacy.items():
+        item_id, _, size = str(key).partition(":")
+        if item_id.isdigit() and str(quantity).isdigit() and int(quantity) > 0:
+            quantities[(int(item_id), size)] = int(quantity)
+    if not quantities:
+        return
+    match = Q()
+    for item_id, size in quantities:
+        match |= Q(item_id=item_id, size=size)
+    lines = [
+        CartLine(cart=cart, variant_id=pk, quantity=quantities[(item_id, size)])
+        for pk, item_id, size in ItemVariant.objects.filter(match).values_list(
+            "pk", "item_id", "size"
+        )
+    ]
+    if lines:
+        CartLine.objects.bulk_create(
+            lines,
+            update_conflicts=True,
+            unique_fields=["cart", "variant"],
+            update_fields=["quantity"],
+        )
+
+
+def get_cart(request, create=False):
+    """
+    Return the request's Cart: the user's own when logged in, otherwise the
+    anonymous cart referenced from the session. With create=True a missing
+    cart is created; otherwise None is returned for it.
+    """
+    user = request.user
+    if user.is_authenticated:
+        cart = Cart.objects.filter(user=user).first()
+        if cart is None and create:
+            cart, _ = Cart.objects.get_or_create(user=user)
+    else:
+        cart_id = request.session.get(CART_SESSION_KEY)
+        cart = (
+            Cart.objects.filter(pk=cart_id, user__isnull=True).first()
+            if cart_id
+            else None
+        )
+        if cart is None and create:
+            cart = Cart.objects.create()
+            request.session[CART_SESSION_KEY] = cart.pk
+
+    if LEGACY_CART_SESSION_KEY in request.session:
+        cart = cart or get_cart(request, create=True)
+        _import_legacy_cart(request, cart)
+    if LEGACY_SIZES_SESSION_KEY in request.session:
+        # sizes are remembered per variant now (see "selected_variants")
+        del request.session[LEGACY_SIZES_SESSION_KEY]
+    return cart
+
+
+def get_cart_lines(request):
+    """
+    Return the CartLines (with variant and item loaded) of the request's cart
+    in one indexed query. Lines of deleted variants are removed by cascade.
+    """
+    if LEGACY_CART_SESSION_KEY in request.session:
+        get_cart(request)
+    lines = CartLine.objects.select_related("variant__item").order_by("pk")
+    if request.user.is_authenticated:
+        return list(lines.filter(cart__user=request.user))
+    cart_id = request.session.get(CART_SESSION_KEY)
+    return list(lines.filter(cart_id=cart_id)) if cart_id else []
+
+
+def merge_session_cart(request, user):
+    """
+    Fold the anonymous cart referenced from the session into `user`'s cart;
+    called on login. Adopts the anonymous cart if the user has none yet.
+    """
+    cart_id = request.session.pop(CART_SESSION_KEY, None)
+    if not cart_id:
+        return
+    anonymous = Cart.objects.filter(pk=cart_id, user__isnull=True).first()
+    if anonymous is None:
+        return
+    own = Cart.objects.filter(user=user).first()
+    if own is None:
+        Cart.objects.filter(pk=anonymous.pk).update(user=user)
+    else:
+        merge_carts(anonymous, own)
+
+
+def purge_anonymous_carts(cutoff, batch_size=500):
+    """Delete one batch of anonymous carts untouched since `cutoff`."""
+    ids = list(
+        Cart.objects.filter(user__isnull=True, updated_at__lt=cutoff)
+        .order_by("updated_at")
+        .values_list("id", flat=True)[:batch_size]
+    )
+    if ids:
+        Cart.objects.filter(id__in=ids).delete()
+    return len(ids)
+
+
+def variant_for_cart(cart, variant_id):
+    """
+    The variant with its item, annotated with the quantity already in `cart`
+    as `in_cart`, in one query; None if the variant doesn't exist.
+    """
+    in_cart = CartLine.objects.filter(cart=cart, variant=OuterRef("pk")).values(
+        "quantity"
+    )[:1]
+    return (
+        ItemVariant.objects.select_related("item")
+        .annotate(in_cart=Coalesce(Subquery(in_cart), 0))
+        .filter(pk=variant_id)
+        .first()
+    )
+
+
+def cart_summary(cart):
+    """(total amount, number of pieces) of the cart, aggregated in the database."""
+    summary = CartLine.objects.filter(cart=cart).aggregate(
+        total=Sum(
+            F("quantity") * (F("variant__item__price") + F("variant__price_delta")),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        ),
+        count=Sum("quantity"),
+    )
+    total = (summary["total"] or Decimal("0")).quantize(Decimal("0.01"))
+    return total, summary["count"] or 0
+
+
+def user_cart_count(user):
+    """Number of pieces in the user's cart, for the navbar badge."""
+    count = CartLine.objects.filter(cart__user=user).aggregate(count=Sum("quantity"))
+    return count["count"] or 0
+
+
+def cart_total(lines) -> Decimal:
+    return sum((line.amount for line in lines), Decimal("0"))
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from cart.stk_dispatch import process_due_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Send queued M-Pesa STK push requests. Run one or more of these "
+        "alongside the web server; workers never pick up the same job."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=10)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=1.0,
+            help="Seconds to sleep when the queue is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Process one batch and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_due_jobs(options["batch_size"])
+            if processed:
+                self.stdout.write(f"Processed {processed} STK push job(s)")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["poll_interval"])
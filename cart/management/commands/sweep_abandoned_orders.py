@@ -0,0 +1,101 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.snapshots import refresh_stale_snapshots
+from cart.cart_lines import purge_anonymous_carts
+from cart.orders import expire_abandoned_orders, purge_expired_orders
+
+
+class Command(BaseCommand):
+    help = (
+        "Release the stock held by unpaid orders older than the reservation "
+        "timeout and optionally delete long-expired ones. Also re-renders "
+        "stale catalog snapshots. Safe to run on several nodes at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than",
+            type=int,
+            default=settings.ORDER_RESERVATION_TIMEOUT,
+            help="Minutes an unpaid order keeps its stock reservation",
+        )
+        parser.add_argument(
+            "--purge-after-days",
+            type=int,
+            default=None,
+            help="Also delete expired unpaid orders older than this many days",
+        )
+        parser.add_argument(
+            "--purge-carts-after-days",
+            type=int,
+            default=None,
+            help="Also delete anonymous carts untouched for this many days",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=60,
+            help="Seconds between sweeps when running continuously",
+        )
+        parser.add_argument("--once", action="store_true", help="Sweep once and exit")
+
+    def _drain(self, step, cutoff, batch_size):
+        total = 0
+        started = time.monotonic()
+        while True:
+            count = step(cutoff, batch_size)
+            total += count
+            if count < batch_size:
+                break
+        return total, time.monotonic() - started
+
+    def handle(self, *args, **options):
+        while True:
+            now = timezone.now()
+            expired, elapsed = self._drain(
+                expire_abandoned_orders,
+                now - timedelta(minutes=options["older_than"]),
+                options["batch_size"],
+            )
+            self.stdout.write(
+                f"Expired {expired} unpaid order(s) in {elapsed:.2f}s "
+                f"({expired / elapsed if elapsed else 0:.0f}/s)"
+            )
+            if options["purge_after_days"] is not None:
+                purged, elapsed = self._drain(
+                    purge_expired_orders,
+                    now - timedelta(days=options["purge_after_days"]),
+                    options["batch_size"],
+                )
+                self.stdout.write(
+                    f"Deleted {purged} expired order(s) in {elapsed:.2f}s "
+                    f"({purged / elapsed if elapsed else 0:.0f}/s)"
+                )
+            if options["purge_carts_after_days"] is not None:
+                carts, elapsed = self._drain(
+                    purge_anonymous_carts,
+                    now - timedelta(days=options["purge_carts_after_days"]),
+                    options["batch_size"],
+                )
+                self.stdout.write(
+                    f"Deleted {carts} anonymous cart(s) in {elapsed:.2f}s "
+                    f"({carts / elapsed if elapsed else 0:.0f}/s)"
+                )
+            if settings.CATALOG_SNAPSHOTS_ENABLED:
+                # halfway to the max age, so the middleware never finds them expired
+                started = time.monotonic()
+                pages = refresh_stale_snapshots(settings.CATALOG_SNAPSHOT_MAX_AGE / 2)
+                if pages is not None:
+                    self.stdout.write(
+                        f"Rendered home and {pages} category page snapshot(s) "
+                        f"in {time.monotonic() - started:.2f}s"
+                    )
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
@@ -0,0 +1,87 @@
+import threading
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class MpesaClient:
+    """
+    HTTP client for the Daraja API that keeps a pooled keep-alive session, so
+    consecutive calls reuse the TCP+TLS connection instead of reconnecting.
+    """
+
+    def __init__(
+        self,
+        base_url,
+        consumer_key,
+        consumer_secret,
+        connect_timeout=5,
+        read_timeout=30,
+        pool_size=10,
+        max_retries=3,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.auth = (consumer_key, consumer_secret)
+        self.timeout = (connect_timeout, read_timeout)
+
+        # connection failures are retried for every call since nothing was sent;
+        # read errors and 5xx responses only for idempotent GETs (token fetch)
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=max_retries,
+            status=max_retries,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 503, 504],
+            allowed_methods=frozenset(["GET"]),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size, max_retries=retry
+        )
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def generate_token(self):
+        return self.session.get(
+            f"{self.base_url}/oauth/v1/generate",
+            params={"grant_type": "client_credentials"},
+            auth=self.auth,
+            timeout=self.timeout,
+        )
+
+    def stk_push(self, payload, access_token):
+        return self.session.post(
+            f"{self.base_url}/mpesa/stkpush/v1/processrequest",
+            json=payload,
+            headers={"Authorization": f"Bearer {access_token}"},
+            timeout=self.timeout,
+        )
+
+    def close(self):
+        self.session.close()
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_mpesa_client():
+    """Return this worker process's shared MpesaClient, creating it on first use."""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = MpesaClient(
+                    settings.MPESA_BASE_URL,
+                    settings.MPESA_CONSUMER_KEY,
+                    settings.MPESA_CONSUMER_SECRET,
+                    connect_timeout=settings.MPESA_CONNECT_TIMEOUT,
+                    read_timeout=settings.MPESA_READ_TIMEOUT,
+                    pool_size=settings.MPESA_POOL_SIZE,
+                    max_retries=settings.MPESA_MAX_RETRIES,
+                )
+    return _client
@@ -0,0 +1,87 @@
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.inventory import cart_quantities, reserve_stock, restock, variant_quantities
+from app.models import Order, OrderItem, StkPushRequest
+
+from .cart_lines import cart_total
+
+
+def place_order(user, phone_number, address, lines):
+    """
+    Reserve stock for the lines, then create an unpaid Order and all of its
+    OrderItems atomically. Lines are priced from their already-loaded variants
+    with the same rule as OrderItem.save, so checkout costs a fixed number of
+    queries. Raises InsufficientStock if any variant cannot be reserved.
+    """
+    with transaction.atomic():
+        reserve_stock(cart_quantities(lines))
+        order = Order.objects.create(
+            user=user,
+            phone_number=phone_number,
+            address=address,
+            total_amount=cart_total(lines),
+            is_paid=False,
+            transaction_date=timezone.now(),
+            stock_status=Order.STOCK_RESERVED,
+        )
+        order_items = []
+        for line in lines:
+            order_item = OrderItem(
+                order=order,
+                item=line.item,
+                variant=line.variant,
+                quantity=line.quantity,
+                size=line.size,
+            )
+            # bulk_create bypasses save(), so apply its subtotal rule here
+            order_item.subtotal = order_item.calculate_subtotal()
+            order_items.append(order_item)
+        OrderItem.objects.bulk_create(order_items)
+    return order
+
+
+def expire_abandoned_orders(cutoff, batch_size=500):
+    """
+    Release the stock reserved by one batch of unpaid orders placed before
+    `cutoff`, and cancel their STK pushes if still queued. Runs in one short
+    transaction; rows locked by another sweeper are skipped, so several nodes
+    can sweep at once. Returns the number of orders expired.
+    """
+    with transaction.atomic():
+        qs = Order.objects.filter(
+            is_paid=False,
+            transaction_date__lt=cutoff,
+            stock_status=Order.STOCK_RESERVED,
+        ).order_by("transaction_date")
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        order_ids = list(qs.values_list("id", flat=True)[:batch_size])
+        if not order_ids:
+            return 0
+
+        restock(variant_quantities(OrderItem.objects.filter(order_id__in=order_ids)))
+        Order.objects.filter(id__in=order_ids).update(stock_status=Order.STOCK_RELEASED)
+        StkPushRequest.objects.filter(
+            order_id__in=order_ids, status=StkPushRequest.PENDING
+        ).update(status=StkPushRequest.FAILED, last_error="Order expired")
+    return len(order_ids)
+
+
+def purge_expired_orders(cutoff, batch_size=500):
+    """
+    Delete one batch of unpaid, already released orders placed before
+    `cutoff` (their items and STK pushes cascade). Returns the number deleted.
+    """
+    with transaction.atomic():
+        qs = Order.objects.filter(
+            is_paid=False,
+            transaction_date__lt=cutoff,
+            stock_status=Order.STOCK_RELEASED,
+        ).order_by("transaction_date")
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        order_ids = list(qs.values_list("id", flat=True)[:batch_size])
+        if order_ids:
+            Order.objects.filter(id__in=order_ids).delete()
+    return len(order_ids)
@@ -0,0 +1,170 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.inventory import release_order_stock
+from app.models import Order, StkPushRequest
+
+from .stk_push import StkPushOutcomeUnknown, initiate_stk_push
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue_stk_push(order, phone_number, amount, account_reference, transaction_desc):
+    """
+    Queue an STK push for an order. Call this inside the transaction that
+    creates the order so the job only becomes visible once the order commits.
+    """
+    return StkPushRequest.objects.create(
+        order=order,
+        phone_number=phone_number,
+        amount=amount,
+        account_reference=account_reference,
+        transaction_desc=transaction_desc,
+    )
+
+
+def claim_due_job():
+    """
+    Take the next due pending job for this worker in a short transaction:
+    it is marked SENDING with a lease (next_attempt_at) that outlasts the
+    M-Pesa call, so no row lock or transaction is held during the call.
+    Rows locked by other workers are skipped. Returns None if none is due.
+    """
+    with transaction.atomic():
+        qs = StkPushRequest.objects.filter(
+            status=StkPushRequest.PENDING, next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at")
+        if connection.features.has_select_for_update_skip_locked:
+            qs = qs.select_for_update(skip_locked=True)
+        job = qs.first()
+        if job is not None:
+            job.status = StkPushRequest.SENDING
+            job.attempts += 1
+            job.next_attempt_at = timezone.now() + timedelta(
+                seconds=settings.STK_PUSH_LEASE
+            )
+            job.save(
+                update_fields=["status", "attempts", "next_attempt_at", "updated_at"]
+            )
+    return job
+
+
+def recover_expired_leases():
+    """
+    Mark jobs whose worker died during the M-Pesa call (lease expired while
+    SENDING) for reconciliation: the push may have gone out, so resending it
+    could prompt the customer twice. Returns the number of jobs marked.
+    """
+    return StkPushRequest.objects.filter(
+        status=StkPushRequest.SENDING, next_attempt_at__lte=timezone.now()
+    ).update(
+        status=StkPushRequest.UNCERTAIN,
+        last_error="Worker stopped while sending the STK push",
+        updated_at=timezone.now(),
+    )
+
+
+def _retry_delay(attempts):
+    # exponential backoff: base, 2*base, 4*base, ... capped at 5 minutes
+    return min(settings.STK_PUSH_RETRY_BACKOFF * 2 ** (attempts - 1), 300)
+
+
+def _release_stock(job):
+    # the customer was never prompted, so the order can no longer be paid
+    order = Order.objects.select_for_update().get(pk=job.order_id)
+    if release_order_stock(order):
+        logger.info("Released reserved stock for Order %s", order.id)
+
+
+def process_job(job):
+    """
+    Send one STK push and record the outcome. Only pushes that certainly
+    weren't processed are retried; when the outcome is unknown (e.g. a read
+    timeout) the job is left for reconciliation instead of prompting the
+    customer a second time. `job` must have been claimed with claim_due_job;
+    the call runs outside any transaction and the outcome is saved in a
+    short one of its own.
+    """
+    uncertain = False
+    try:
+        response = initiate_stk_push(
+            phone_number=job.phone_number,
+            amount=float(job.amount),
+            account_reference=job.account_reference,
+            transaction_desc=job.transaction_desc,
+        )
+    except StkPushOutcomeUnknown as e:
+        logger.error("STK push for Order %s may have been sent: %s", job.order_id, e)
+        response, error, uncertain = None, str(e), True
+    except Exception as e:
+        # raised before the push left (no token, connection refused) or
+        # while Safaricom turned it away (5xx, 429): safe to send again
+        logger.warning("STK push for Order %s was not sent: %s", job.order_id, e)
+        response, error = None, str(e)
+    else:
+        error = "" if response else "Empty or invalid response from M-Pesa"
+
+    with transaction.atomic():
+        _record_outcome(job, response, error, uncertain)
+    logger.info(
+        "STK push for Order %s: status=%s attempts=%s",
+        job.order_id,
+        job.status,
+        job.attempts,
+    )
+    return job
+
+
+def _record_outcome(job, response, error, uncertain):
+    job.response = response
+    if uncertain:
+        # the order keeps its reservation until sweep_abandoned_orders expires it
+        job.status = StkPushRequest.UNCERTAIN
+        job.last_error = error
+    elif response and response.get("ResponseCode") == "0":
+        job.status = StkPushRequest.SENT
+        job.last_error = ""
+        # the callback is matched back to the order by CheckoutRequestID
+        Order.objects.filter(pk=job.order_id).update(
+            checkout_request_id=response.get("CheckoutRequestID"),
+            merchant_request_id=response.get("MerchantRequestID"),
+        )
+    elif response and str(response.get("errorCode", "")).startswith("400"):
+        # request rejected (e.g. invalid phone number); retrying will not help
+        job.status = StkPushRequest.FAILED
+        job.last_error = response.get("errorMessage", "Request rejected by M-Pesa")
+        _release_stock(job)
+    elif job.attempts >= settings.STK_PUSH_MAX_ATTEMPTS:
+        job.status = StkPushRequest.FAILED
+        job.last_error = error or str(response)
+        _release_stock(job)
+    else:
+        job.status = StkPushRequest.PENDING
+        job.last_error = error or str(response)
+        job.next_attempt_at = timezone.now() + timedelta(
+            seconds=_retry_delay(job.attempts)
+        )
+    job.save()
+
+
+def process_due_jobs(limit=10):
+    """
+    Process up to `limit` due jobs one at a time. Each is claimed and its
+    outcome recorded in short transactions, so a slow M-Pesa call holds
+    neither a row lock nor an open transaction. Returns the number processed.
+    """
+    recovered = recover_expired_leases()
+    if recovered:
+        logger.error("%s STK push job(s) need reconciliation", recovered)
+    processed = 0
+    while processed < limit:
+        job = claim_due_job()
+        if job is None:
+            break
+        process_job(job)
+        processed += 1
+    return processed
@@ -1,32 +1,117 @@
 import base64
 import json
 import logging
+import time
 from datetime import datetime
 
 import requests
 from django.conf import settings
+from django.core.cache import cache
+from urllib3.exceptions import NewConnectionError
+
+from .mpesa_client import get_mpesa_client
 
 logger = logging.getLogger(__name__)
 
+ACCESS_TOKEN_KEY = "mpesa:access-token"
+ACCESS_TOKEN_LOCK_KEY = "mpesa:access-token:lock"
+# refresh this many seconds before Safaricom expires the token
+ACCESS_TOKEN_REFRESH_MARGIN = 60
+# how long other workers wait for the refreshing worker before fetching themselves
+ACCESS_TOKEN_LOCK_TIMEOUT = 10
+# statuses meaning Safaricom turned the request away without acting on it
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class StkPushOutcomeUnknown(Exception):
+    """
+    The STK push may have reached Safaricom but no usable answer came back
+    (e.g. a read timeout), so the customer may already have been prompted.
+    """
+
+
+class StkPushNotSent(Exception):
+    """The STK push was turned away unprocessed; sending it again is safe."""
 
-def get_access_token():
-    url = f"{settings.MPESA_BASE_URL}/oauth/v1/generate?grant_type=client_credentials"
-    response = requests.get(
-        url, auth=(settings.MPESA_CONSUMER_KEY, settings.MPESA_CONSUMER_SECRET)
-    )
+
+def _stk_push_request(client, payload, access_token):
+    try:
+        response = client.stk_push(payload, access_token)
+    except requests.ConnectTimeout:
+        raise
+    except requests.ConnectionError as e:
+        # only a failure to open the connection is known to precede sending;
+        # a dropped connection may have happened after Safaricom read the body
+        reason = getattr(e.args[0] if e.args else None, "reason", None)
+        if isinstance(reason, NewConnectionError):
+            raise
+        raise StkPushOutcomeUnknown(str(e)) from e
+    except Exception as e:
+        raise StkPushOutcomeUnknown(str(e)) from e
+    if response.status_code in RETRYABLE_STATUS_CODES:
+        raise StkPushNotSent(f"M-Pesa answered HTTP {response.status_code}")
+    return response
+
+
+def _fetch_access_token():
+    """Request a new token from Safaricom. Returns (token, expires_in)."""
+    response = get_mpesa_client().generate_token()
 
     try:
         data = response.json()
-        return data.get("access_token")
     except ValueError:
-        print("Access token response was not valid JSON:", response.text)
-        return None
+        logger.error("Access token response was not valid JSON: %s", response.text)
+        return None, 0
+    return data.get("access_token"), int(data.get("expires_in") or 0)
+
+
+def _refresh_access_token():
+    token, expires_in = _fetch_access_token()
+    if token:
+        timeout = max(expires_in - ACCESS_TOKEN_REFRESH_MARGIN, 1)
+        cache.set(ACCESS_TOKEN_KEY, token, timeout)
+    return token
+
+
+def get_access_token():
+    """
+    Return an M-Pesa access token, shared across workers through the cache and
+    refreshed shortly before it expires. Only the worker holding the refresh
+    lock calls Safaricom; the others wait for it to publish the new token.
+    """
+    token = cache.get(ACCESS_TOKEN_KEY)
+    if token:
+        return token
+
+    if cache.add(ACCESS_TOKEN_LOCK_KEY, 1, ACCESS_TOKEN_LOCK_TIMEOUT):
+        try:
+            return _refresh_access_token()
+        finally:
+            cache.delete(ACCESS_TOKEN_LOCK_KEY)
+
+    deadline = time.monotonic() + ACCESS_TOKEN_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.1)
+        token = cache.get(ACCESS_TOKEN_KEY)
+        if token:
+            return token
+    # the refreshing worker gave up or died; fetch one ourselves
+    return _refresh_access_token()
+
+
+def invalidate_access_token():
+    cache.delete(ACCESS_TOKEN_KEY)
 
 
 def initiate_stk_push(phone_number, amount, account_reference, transaction_desc):
+    """
+    Send an STK push and return Safaricom's JSON answer. Raises
+    StkPushOutcomeUnknown when the push may have been processed without an
+    answer to show for it; any other exception means it wasn't sent.
+    """
     access_token = get_access_token()
     if not access_token:
-        print("Failed to retrieve access token.")
+        logger.error("Failed to retrieve access token")
         return {}
 
     timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
@@ -34,11 +119,6 @@ def initiate_stk_push(phone_number, amount, account_reference, transaction_desc)
         (settings.MPESA_SHORTCODE + settings.MPESA_PASSKEY + timestamp).encode()
     ).decode()
 
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Content-Type": "application/json",
-    }
-
     payload = {
         "BusinessShortCode": settings.MPESA_SHORTCODE,
         "Password": password,
@@ -55,11 +135,23 @@ def initiate_stk_push(phone_number, amount, account_reference, transaction_desc)
 
     logger.info("Actual STK Push payload: %s", json.dumps(payload, indent=2))
 
-    url = f"{settings.MPESA_BASE_URL}/mpesa/stkpush/v1/processrequest"
-    response = requests.post(url, json=payload, headers=headers)
+    client = get_mpesa_client()
+    response = _stk_push_request(client, payload, access_token)
+
+    if response.status_code == 401:
+        # token revoked or expired early; retry once with a fresh one
+        logger.warning("STK Push rejected the access token, refreshing it")
+        invalidate_access_token()
+        access_token = get_access_token()
+        if not access_token:
+            logger.error("Failed to retrieve access token after a 401")
+            return {}
+        response = _stk_push_request(client, payload, access_token)
 
     try:
         return response.json()
     except ValueError:
-        print("STK Push response was not valid JSON:", response.text)
-        return {}
+        logger.error("STK Push response was not valid JSON: %s", response.text)
+        raise StkPushOutcomeUnknown(
+            f"HTTP {response.status_code} response was not valid JSON"
+        )
@@ -6,10 +6,11 @@ urlpatterns = [
     path("mycart/", user_views.cart, name="mycart"),
     path("cart/add/<int:item_id>/", user_views.add_to_cart, name="add_to_cart"),
     path(
-        "cart/remove/<int:item_id>/",
+        "cart/remove/<int:variant_id>/",
         user_views.remove_from_cart,
         name="remove_from_cart",
     ),
+    path("api/cart/", user_views.cart_api, name="cart_api"),
     path("save-cart-intent/", user_views.save_cart_intent, name="save_cart_intent"),
     path(
         "process_cart_intent/",
@@ -17,4 +18,5 @@ urlpatterns = [
         name="process_cart_intent",
     ),
     path("payment/pending/", user_views.payment_pending, name="payment_pending"),
+    path("payment/status/", user_views.payment_status, name="payment_status"),
 ]
@@ -1,104 +1,185 @@
-import json
 import logging
+import time
 
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render, reverse
-from django.utils import timezone
-from django.views.decorators.csrf import csrf_exempt
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
 from django.views.decorators.http import require_POST
 
-from app.models import Items, Order, OrderItem
-
+from app.inventory import InsufficientStock
+from app.models import Items, ItemVariant, Order, StkPushRequest
+from payments.notifier import wait_for_order_update
+
+from .cart_lines import (
+    add_line_quantity,
+    cart_summary,
+    cart_total,
+    decrement_line,
+    get_cart,
+    get_cart_lines,
+    line_quantity,
+    remove_line,
+    remove_lines,
+    set_line_quantity,
+    variant_for_cart,
+)
 from .forms import PaymentForm
-from .stk_push import initiate_stk_push
+from .orders import place_order
+from .stk_dispatch import enqueue_stk_push
 
 logger = logging.getLogger(__name__)
 
+# longest a payment_status request may be held open waiting for the callback
+PAYMENT_STATUS_MAX_WAIT = 25
+# how often a held request re-reads the order, for callbacks handled elsewhere
+PAYMENT_STATUS_RECHECK_INTERVAL = 3
+
 
 @require_POST
 @login_required
 def add_to_cart(request, item_id):
     item = get_object_or_404(Items, id=item_id)
-    cart = request.session.get("cart", {})
 
-    # Get quantity and size
+    # Get quantity and the chosen size (variant) of this item
     quantity = int(request.POST.get("quantity", 1))
-    size = request.POST.get("size")
+    variant_id = request.POST.get("variant", "")
+    variant = (
+        ItemVariant.objects.filter(item=item, id=variant_id).only("id").first()
+        if variant_id.isdigit()
+        else None
+    )
 
-    # Enforce size selection only if item requires it
-    if item.sizes and not size:
+    # Every item has at least one variant, so a missing one means no size chosen
+    if variant is None:
         messages.warning(request, "Please select a size before adding to cart.")
         return redirect("item_details", item_id=item_id)
 
     # Save selected size to session
-    if size:
-        selected_sizes = request.session.get("selected_sizes", {})
-        selected_sizes[str(item_id)] = size
-        request.session["selected_sizes"] = selected_sizes
+    selected_variants = request.session.get("selected_variants", {})
+    selected_variants[str(item_id)] = variant.id
+    request.session["selected_variants"] = selected_variants
 
-    # Build item key and update cart
-    item_key = f"{item_id}:{size}" if size else str(item_id)
-    cart[item_key] = quantity
-    request.session["cart"] = cart
+    # one upsert on the (cart, variant) line
+    set_line_quantity(get_cart(request, create=True), variant.id, quantity)
 
     return redirect("mycart")
 
 
 @login_required
-def remove_from_cart(request, item_id):
-    item = get_object_or_404(Items.objects.prefetch_related("images"), id=item_id)
-    cart = request.session.get("cart", {})
-    stock = item.stock
-    size = request.POST.get("size")
-    item_key = f"{item_id}:{size}" if size else str(item_id)
+def remove_from_cart(request, variant_id):
+    # only the stock is needed here: a single primary key lookup
+    variant = get_object_or_404(ItemVariant.objects.only("stock"), id=variant_id)
+    cart = get_cart(request, create=True)
+    stock = variant.stock
     quantity = int(request.POST.get("quantity", 1))
     action = request.POST.get("action")
 
     if action == "increase" and quantity < stock:
-        quantity += 1
-        cart[item_key] = quantity
-    elif action == "decrease" and quantity > 0:
-        quantity -= 1
-        cart[item_key] = quantity
-    elif action == "decrease" and quantity == 0:
-        cart[item_key] = 0
+        set_line_quantity(cart, variant_id, quantity + 1)
+    elif action == "decrease":
+        # a quantity of zero removes the line
+        set_line_quantity(cart, variant_id, quantity - 1)
     elif action == "add":
-        cart[item_key] = quantity
+        set_line_quantity(cart, variant_id, quantity)
     elif action == "remove":
-        cart.pop(item_key, None)
-    if cart.get(item_key, 0) == 0:
-        cart.pop(item_key, None)
-    request.session["cart"] = cart
+        remove_line(cart, variant_id)
     return redirect(
         request.META.get("HTTP_REFERER", "category_items")
     )  # Redirecting the user to the same page
 
 
+@require_POST
 @login_required
-def cart(request):
-    cart = request.session.get("cart", {})
-    logger.info("Cart session retrieved for user %s: %s", request.user.username, cart)
-
-    cart_items = []
-    total = 0
-
-    for key, quantity in cart.items():
-        if ":" in key:
-            item_id, size = key.split(":", 1)
-        else:
-            item_id, size = key, None
-        item = Items.objects.get(id=item_id)
-        amount = item.price * quantity
-        total += amount
-        cart_items.append(
+def cart_api(request):
+    """
+    Change one cart line and answer with JSON instead of a redirect: the
+    updated line, the cart total and the piece count for the navbar badge.
+    POST "variant" names the line and "action" is add, set, increment,
+    decrement or remove; add and set take a "quantity". Increases beyond
+    the stock are refused with a 409.
+    """
+    variant_id = request.POST.get("variant", "")
+    if not variant_id.isdigit():
+        return JsonResponse({"error": "Please select a size."}, status=400)
+    action = request.POST.get("action")
+    if action not in ("add", "set", "increment", "decrement", "remove"):
+        return JsonResponse({"error": "Unknown cart action"}, status=400)
+    try:
+        quantity = int(request.POST.get("quantity", 1))
+    except ValueError:
+        return JsonResponse({"error": "Invalid quantity"}, status=400)
+    if quantity < 0:
+        return JsonResponse({"error": "Invalid quantity"}, status=400)
+
+    cart = get_cart(request, create=True)
+    # stock, price and the current line come back together
+    variant = variant_for_cart(cart, variant_id)
+    if variant is None:
+        return JsonResponse({"error": "Item not found"}, status=404)
+
+    current = variant.in_cart
+    new_quantity = max(
+        {
+            "add": current + quantity,
+            "set": quantity,
+            "increment": current + 1,
+            "decrement": current - 1,
+            "remove": 0,
+        }[action],
+        0,
+    )
+    # lowering a line is always allowed, even if stock has since dropped
+    if new_quantity > current and new_quantity > variant.stock:
+        return JsonResponse(
             {
-                "item": item,
-                "quantity": quantity,
-                "amount": float(amount),
-                "size": size,
-            }
+                "error": f"Only {variant.stock} of {variant} left in stock.",
+                "available": variant.stock,
+            },
+            status=409,
         )
+    if new_quantity != current:
+        # increments and decrements are applied to the stored quantity in the
+        # database, so concurrent requests for the same line all count
+        if action in ("add", "increment"):
+            add_line_quantity(cart, variant.pk, new_quantity - current)
+        elif action == "decrement":
+            decrement_line(cart, variant.pk)
+        else:
+            set_line_quantity(cart, variant.pk, new_quantity)
+        new_quantity = line_quantity(cart, variant.pk)
+    selected_variants = request.session.get("selected_variants", {})
+    if (
+        action in ("add", "set")
+        and selected_variants.get(str(variant.item_id)) != variant.pk
+    ):
+        # remember the size like add_to_cart, without rewriting an unchanged session
+        selected_variants[str(variant.item_id)] = variant.pk
+        request.session["selected_variants"] = selected_variants
+
+    total, count = cart_summary(cart)
+    return JsonResponse(
+        {
+            "line": {
+                "variant_id": variant.pk,
+                "quantity": new_quantity,
+                "amount": str(variant.price * new_quantity),
+            },
+            "total": str(total),
+            "count": count,
+        }
+    )
+
+
+@login_required
+def cart(request):
+    # the lines with their variants and items are loaded in one query
+    cart_items = get_cart_lines(request)
+    total = cart_total(cart_items)
 
     logger.info(
         "Cart items calculated for user %s: %s", request.user.username, cart_items
@@ -133,7 +214,6 @@ def cart(request):
                         "cart_items": cart_items,
                         "total": float(total),
                         "form": form,
-                        "cart": cart,
                         "error": "Invalid phone number format.",
                     },
                 )
@@ -143,61 +223,47 @@ def cart(request):
                 phone_number,
             )
 
-            # Create order
-            order = Order.objects.create(
-                user=request.user,
-                phone_number=phone_number,
-                address=address,
-                total_amount=total,
-                is_paid=False,
-                transaction_date=timezone.now(),
-            )
-            logger.info(
-                "Order created: %s with reference_code %s",
-                order.id,
-                order.reference_code,
-            )
-
-            # Create order items
-            for entry in cart_items:
-                OrderItem.objects.create(
-                    order=order,
-                    item=entry["item"],
-                    quantity=entry["quantity"],
-                    subtotal=entry["amount"],
-                    size=entry["size"],
+            # Create the order, reserve its stock and queue the STK push together;
+            # the push itself is sent by the run_stk_worker command
+            try:
+                with transaction.atomic():
+                    order = place_order(request.user, phone_number, address, cart_items)
+                    account_reference = str(order.reference_code).replace("-", "")[:20]
+                    enqueue_stk_push(
+                        order,
+                        phone_number=phone_number,
+                        amount=total,
+                        account_reference=account_reference,
+                        transaction_desc=f"Payment for {request.user.username}",
+                    )
+                    # the ordered lines leave the cart with the order
+                    remove_lines(cart_items)
+            except InsufficientStock as e:
+                logger.warning(
+                    "Checkout by user %s failed: %s", request.user.username, e
                 )
-            logger.info("OrderItems created for Order %s", order.id)
-
-            # Trigger STK Push
-            account_reference = str(order.reference_code).replace("-", "")[:20]
-            response = initiate_stk_push(
-                phone_number=phone_number,
-                amount=float(total),
-                account_reference=account_reference,
-                transaction_desc=f"Payment for {request.user.username}",
-            )
-            logger.info(
-                "STK Push Payload for Order %s: %s",
-                order.id,
-                json.dumps(
+                return render(
+                    request,
+                    "cart_templates/cart.html",
                     {
-                        "phone_number": phone_number,
-                        "amount": float(total),
-                        "account_reference": account_reference,
-                        "transaction_desc": f"Payment for {request.user.username}",
+                        "cart_items": cart_items,
+                        "total": float(total),
+                        "form": form,
+                        "error": f"{e}. Please update your cart.",
                     },
-                    indent=2,
-                ),
+                )
+            logger.info(
+                "Order created: %s with reference_code %s and %d items",
+                order.id,
+                order.reference_code,
+                len(cart_items),
             )
-            logger.info("STK Push response for Order %s: %s", order.id, response)
+            logger.info("STK Push queued for Order %s", order.id)
 
             # Track pending order
             request.session["pending_order_id"] = order.id
             logger.info("Pending order ID stored in session: %s", order.id)
 
-            # Optional: clear cart
-            request.session["cart"] = {}
             logger.info("Cart cleared for user %s", request.user.username)
 
             return redirect("payment_pending")
@@ -216,39 +282,146 @@ def cart(request):
     return render(
         request,
         "cart_templates/cart.html",
-        {"cart_items": cart_items, "total": total, "form": form, "cart": cart},
+        {"cart_items": cart_items, "total": total, "form": form},
     )
 
 
 @login_required
-def payment_pending(request):
-    order_id = request.session.get("pending_order_id")
+async def payment_pending(request):
+    # async so that customers polling this page don't tie up a worker thread
+    order_id = await request.session.aget("pending_order_id")
     if not order_id:
         return redirect("mycart")
 
+    user = await request.auser()
     try:
-        order = Order.objects.get(id=order_id, user=request.user)
+        order = await Order.objects.select_related("stk_push").aget(
+            id=order_id, user=user
+        )
     except Order.DoesNotExist:
         return redirect("mycart")
 
     if order.is_paid:
         return redirect("success_page")
 
-    return render(request, "cart_templates/payment_pending.html", {"order": order})
+    stk_push = getattr(order, "stk_push", None)
+    # template rendering runs the (sync) context processors
+    return await sync_to_async(render)(
+        request,
+        "cart_templates/payment_pending.html",
+        {"order": order, "stk_push": stk_push},
+    )
+
+
+async def _get_payment_status(order_id, user):
+    status = (
+        await Order.objects.filter(id=order_id, user=user)
+        .values("is_paid", "stk_push__status")
+        .afirst()
+    )
+    if status is None:
+        return None
+    return {
+        "is_paid": status["is_paid"],
+        "stk_push_status": status["stk_push__status"],
+        "redirect_url": reverse("success_page") if status["is_paid"] else None,
+    }
+
+
+@login_required
+async def payment_status(request):
+    """
+    JSON status of the pending order, polled by payment_pending.html.
+    With ?wait=N (ASGI only) the request is held for up to N seconds until
+    mpesa_callback marks the order paid or the STK push fails.
+    """
+    order_id = await request.session.aget("pending_order_id")
+    user = await request.auser()
+    status = await _get_payment_status(order_id, user) if order_id else None
+    if status is None:
+        return JsonResponse({"error": "No pending order"}, status=404)
+
+    try:
+        wait = min(float(request.GET.get("wait", 0)), PAYMENT_STATUS_MAX_WAIT)
+    except ValueError:
+        wait = 0
+    if not isinstance(request, ASGIRequest):
+        # holding the request would block a sync worker; answer immediately
+        wait = 0
+
+    deadline = time.monotonic() + wait
+    while not (status["is_paid"] or status["stk_push_status"] == StkPushRequest.FAILED):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await wait_for_order_update(
+            order_id, min(remaining, PAYMENT_STATUS_RECHECK_INTERVAL)
+        )
+        status = await _get_payment_status(order_id, user)
+
+    return JsonResponse(status)
+
+
+def _intent_variant_id(request, item_id):
+    """The variant a cart intent refers to, or None when no size was chosen."""
+    variant_id = request.session.get("selected_variants", {}).get(str(item_id))
+    if variant_id is not None:
+        return variant_id
+    # no size picked yet: only an item with a single variant can be added
+    variant_ids = list(
+        ItemVariant.objects.filter(item_id=item_id).values_list("id", flat=True)[:2]
+    )
+    return variant_ids[0] if len(variant_ids) == 1 else None
+
+
+def _intent_quantity(value):
+    """A posted cart intent quantity as a positive int, or None if it isn't one."""
+    value = str(value or 1)
+    return int(value) if value.isdigit() and int(value) >= 1 else None
+
+
+def _return_to(request, url):
+    """`url` if it points back into this site, else the home page."""
+    if url and url_has_allowed_host_and_scheme(
+        url, allowed_hosts={request.get_host()}, require_https=request.is_secure()
+    ):
+        return url
+    return "/"
 
 
-@csrf_exempt
 def save_cart_intent(request):
     login_url = reverse("login")
     next_url = reverse("process_cart_intent")
     if request.method == "POST":
+        item_id = request.POST.get("item_id", "")
+        quantity = _intent_quantity(request.POST.get("quantity"))
+        return_to = _return_to(request, request.POST.get("return_to"))
+        if not item_id.isdigit() or quantity is None:
+            messages.warning(request, "Invalid quantity")
+            return redirect(return_to)
+        variant_id = _intent_variant_id(request, item_id)
+        if request.POST.get("action") == "add" and variant_id is not None:
+            # straight into the anonymous cart, which is merged on login
+            cart = get_cart(request, create=True)
+            variant = variant_for_cart(cart, variant_id)
+            if variant is None:
+                messages.warning(request, "Item not found")
+                return redirect("store-home")
+            available = variant.stock - variant.in_cart
+            if available < 1:
+                messages.warning(
+                    request, f"Only {variant.stock} of {variant} left in stock."
+                )
+                return redirect("item_details", item_id=item_id)
+            add_line_quantity(cart, variant.pk, min(quantity, available))
+            return redirect(f"{login_url}?{urlencode({'next': return_to})}")
         request.session["cart_intent"] = {
-            "item_id": request.POST.get("item_id"),
-            "quantity": request.POST.get("quantity"),
+            "item_id": item_id,
+            "quantity": quantity,
             "action": request.POST.get("action"),
-            "return_to": request.POST.get("return_to", "/"),
+            "return_to": return_to,
         }
-        return redirect(f"{login_url}?next={next_url}")
+        return redirect(f"{login_url}?{urlencode({'next': next_url})}")
     return redirect("store-home")
 
 
@@ -257,23 +430,24 @@ def process_cart_intent(request):
     intent = request.session.pop("cart_intent", None)
     if intent:
         item_id = intent.get("item_id")
-        quantity = int(intent.get("quantity", 1))
+        quantity = _intent_quantity(intent.get("quantity")) or 1
         action = intent.get("action")
-        return_to = intent.get("return_to", "/")
-        cart = request.session.get("cart", {})
-        size = request.session.get("selected_sizes", {}).get(str(item_id))
-        item_key = f"{item_id}:{size}" if size else str(item_id)
+        return_to = _return_to(request, intent.get("return_to"))
+        variant_id = _intent_variant_id(request, item_id)
+        if variant_id is None:
+            messages.warning(request, "Please select a size before adding to cart.")
+            return redirect("item_details", item_id=item_id)
+        cart = get_cart(request, create=True)
 
         if action == "add":
-            cart[item_key] = cart.get(item_key, 0) + quantity
+            add_line_quantity(cart, variant_id, quantity)
         elif action == "increase":
-            cart[item_key] = cart.get(item_key, 0) + 1
+            add_line_quantity(cart, variant_id, 1)
         elif action == "decrease":
-            cart[item_key] = max(cart.get(item_key, 1) - 1, 0)
-            if cart[item_key] == 0:
-                cart.pop(item_key, None)
+            line = cart.lines.filter(variant_id=variant_id).only("quantity").first()
+            if line is not None:
+                set_line_quantity(cart, variant_id, line.quantity - 1)
 
-        request.session["cart"] = cart
         return redirect(return_to)
 
     return redirect("store-home")
@@ -1,19 +1,14 @@
-from app.models import ItemCategory, Items
+from app.catalog import get_category_thumbnails
+from cart.cart_lines import user_cart_count
 
 
 def category_context(request):
-    categories = ItemCategory.objects.all()
-    category_images = {}
+    categories, category_images = get_category_thumbnails(request)
+    return {"categories": categories, "category_images": category_images}
 
-    for category in categories:
-        first_item = (
-            Items.objects.filter(category=category).prefetch_related("images").first()
-        )
-        if first_item and first_item.images.exists():
-            category_images[category.id] = first_item.images.first().image_url
-        else:
-            category_images[category.id] = (
-                "app_templates/images/default.png"  # fallback
-            )
 
-    return {"categories": categories, "category_images": category_images}
+def cart_context(request):
+    # anonymous pages are cached and shared, so only logged-in users get a badge
+    if not request.user.is_authenticated:
+        return {}
+    return {"cart_count": user_cart_count(request.user)}
@@ -0,0 +1,12 @@
+# Gunicorn configuration, loaded automatically from the working directory.
+# SERVER_MODE=asgi runs the ASGI app on uvicorn workers so the async views
+# (payment_pending, mpesa_callback) don't block a worker while they wait.
+import os
+
+bind = "0.0.0.0:8000"
+
+if os.getenv("SERVER_MODE", "wsgi") == "asgi":
+    wsgi_app = "store.asgi:application"
+    worker_class = "uvicorn_worker.UvicornWorker"
+else:
+    wsgi_app = "store.wsgi:application"
@@ -0,0 +1,185 @@
+import logging
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+from app.inventory import commit_order_stock, release_order_stock
+from app.models import MpesaCallback, Order
+
+from .notifier import notify_order_update
+
+logger = logging.getLogger(__name__)
+
+
+class OrderNotFound(Exception):
+    pass
+
+
+def _parse_metadata(callback):
+    metadata = {}
+    for entry in callback.get("CallbackMetadata", {}).get("Item", []):
+        metadata[entry.get("Name")] = entry.get("Value")
+    return metadata
+
+
+def _match_order(callback, metadata):
+    """
+    Find the order a callback belongs to and lock it. Matches on the stored
+    CheckoutRequestID first, then AccountReference, then phone + amount.
+    """
+    orders = Order.objects.select_for_update()
+
+    checkout_request_id = callback.get("CheckoutRequestID")
+    if checkout_request_id:
+        order = orders.filter(checkout_request_id=checkout_request_id).first()
+        if order:
+            return order
+
+    account_reference = metadata.get("AccountReference")
+    if account_reference:
+        order = orders.filter(reference_code=account_reference).first()
+        if order:
+            return order
+
+    phone_number = metadata.get("PhoneNumber")
+    amount = metadata.get("Amount")
+    if phone_number and amount is not None:
+        order = (
+            orders.filter(
+                phone_number=str(phone_number),
+                total_amount=Decimal(str(amount)),
+                is_paid=False,
+                transaction_date__gte=timezone.now() - timedelta(minutes=15),
+            )
+            .order_by("-transaction_date")
+            .first()
+        )
+        if order:
+            logger.info("Fallback match succeeded: Order %s", order.id)
+            return order
+
+    raise OrderNotFound(
+        f"No order for CheckoutRequestID={checkout_request_id} "
+        f"AccountReference={account_reference} phone={phone_number} amount={amount}"
+    )
+
+
+def apply_callback(inbox_row):
+    """
+    Apply one inbox row to its order: a successful payment marks it paid and
+    commits its reserved stock, a failed or cancelled one releases the stock.
+    Safe to run any number of times for the same payment: the order row is
+    locked and only an unpaid order changes.
+    Returns the order if this call marked it paid, otherwise None.
+    """
+    callback = inbox_row.payload.get("Body", {}).get("stkCallback", {})
+    result_code = callback.get("ResultCode")
+    metadata = _parse_metadata(callback)
+    order = _match_order(callback, metadata)
+
+    if result_code != 0:
+        logger.warning(
+            "Payment for Order %s not completed. ResultCode: %s, Desc: %s",
+            order.id,
+            result_code,
+            callback.get("ResultDesc"),
+        )
+        if release_order_stock(order):
+            logger.info("Released reserved stock for Order %s", order.id)
+        return None
+
+    if order.is_paid:
+        logger.info("Order %s was already marked as paid", order.id)
+        return None
+
+    order.is_paid = True
+    order.mpesa_receipt_number = metadata.get("MpesaReceiptNumber")
+    order.save(update_fields=["is_paid", "mpesa_receipt_number"])
+    commit_order_stock(order)
+    logger.info("Order %s marked as paid", order.id)
+    return order
+
+
+def claim_due_callbacks(limit):
+    qs = MpesaCallback.objects.filter(
+        status=MpesaCallback.PENDING, next_attempt_at__lte=timezone.now()
+    ).order_by("next_attempt_at")
+    if connection.features.has_select_for_update_skip_locked:
+        qs = qs.select_for_update(skip_locked=True)
+    return list(qs[:limit])
+
+
+def _retry_later(inbox_row, error):
+    inbox_row.error = str(error)
+    if inbox_row.attempts >= settings.MPESA_CALLBACK_MAX_ATTEMPTS:
+        inbox_row.status = MpesaCallback.FAILED
+        logger.error("Giving up on callback %s: %s", inbox_row.id, error)
+    else:
+        inbox_row.next_attempt_at = timezone.now() + timedelta(
+            seconds=settings.MPESA_CALLBACK_RETRY_BACKOFF
+            * 2 ** (inbox_row.attempts - 1)
+        )
+
+
+def process_callback(inbox_row):
+    inbox_row.attempts += 1
+    paid_order = None
+    try:
+        # a savepoint: a failure rolls back only the order changes, so the
+        # row's retry bookkeeping below is still saved
+        with transaction.atomic():
+            paid_order = apply_callback(inbox_row)
+    except OrderNotFound as e:
+        # the callback can overtake the worker storing the CheckoutRequestID
+        _retry_later(inbox_row, e)
+    except Exception as e:
+        # e.g. a malformed Amount or a database error: back off instead of
+        # killing the worker and claiming the same row first after a restart
+        logger.exception("Error applying callback %s", inbox_row.id)
+        _retry_later(inbox_row, e)
+    else:
+        inbox_row.status = MpesaCallback.PROCESSED
+        inbox_row.processed_at = timezone.now()
+        inbox_row.error = ""
+
+    inbox_row.save()
+    if paid_order is not None:
+        transaction.on_commit(lambda: notify_order_update(paid_order.id))
+    return inbox_row
+
+
+def process_callback_by_id(pk):
+    """
+    Process one inbox row right after it was stored, unless a worker already
+    holds it. Used by mpesa_callback to skip the wait for the next worker poll.
+    """
+    try:
+        with transaction.atomic():
+            qs = MpesaCallback.objects.filter(pk=pk, status=MpesaCallback.PENDING)
+            if connection.features.has_select_for_update_skip_locked:
+                qs = qs.select_for_update(skip_locked=True)
+            inbox_row = qs.first()
+            if inbox_row is not None:
+                process_callback(inbox_row)
+    except Exception:
+        # left pending for process_mpesa_callbacks to retry
+        logger.exception("Error processing M-PESA callback %s", pk)
+
+
+def process_pending_callbacks(limit=50):
+    """
+    Process up to `limit` due inbox rows, each in its own transaction.
+    Several workers may run this concurrently. Returns the number processed.
+    """
+    processed = 0
+    while processed < limit:
+        with transaction.atomic():
+            rows = claim_due_callbacks(1)
+            if not rows:
+                break
+            process_callback(rows[0])
+        processed += 1
+    return processed
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from payments.callbacks import process_pending_callbacks
+
+
+class Command(BaseCommand):
+    help = (
+        "Apply queued M-Pesa callbacks to their orders. Several of these can run "
+        "side by side; each callback row is processed by exactly one worker."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument(
+            "--poll-interval",
+            type=float,
+            default=0.5,
+            help="Seconds to sleep when the inbox is empty",
+        )
+        parser.add_argument(
+            "--once", action="store_true", help="Process one batch and exit"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_callbacks(options["batch_size"])
+            if processed:
+                self.stdout.write(f"Processed {processed} callback(s)")
+            if options["once"]:
+                break
+            if not processed:
+                time.sleep(options["poll_interval"])
@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import select
+import threading
+import time
+from collections import defaultdict
+
+from django.db import DatabaseError, connection, connections
+
+logger = logging.getLogger(__name__)
+
+# Postgres channel carrying the ids of updated orders between processes
+CHANNEL = "payments_order_update"
+# seconds the listener waits before reconnecting after losing its connection
+LISTENER_RECONNECT_DELAY = 5
+
+# order_id -> set of (event loop, asyncio.Event) for requests waiting on it
+_waiters = defaultdict(set)
+_lock = threading.Lock()
+_listener = None
+
+
+def _wake(order_id):
+    with _lock:
+        waiters = list(_waiters.get(order_id, ()))
+    for loop, event in waiters:
+        loop.call_soon_threadsafe(event.set)
+
+
+def _listen():
+    """
+    Relay notifications on CHANNEL to the requests waiting in this process.
+    Runs in a daemon thread with its own database connection.
+    """
+    db = connections["default"]
+    while True:
+        try:
+            db.ensure_connection()
+            raw = db.connection
+            with raw.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                # the timeout only bounds how long a silent connection goes unchecked
+                select.select([raw], [], [], 60)
+                raw.poll()
+                while raw.notifies:
+                    _wake(int(raw.notifies.pop(0).payload))
+        except Exception:
+            logger.exception("Order update listener failed, reconnecting")
+            db.close()
+            time.sleep(LISTENER_RECONNECT_DELAY)
+
+
+def _ensure_listener():
+    global _listener
+    with _lock:
+        if _listener is None or not _listener.is_alive():
+            _listener = threading.Thread(
+                target=_listen, name="order-update-listener", daemon=True
+            )
+            _listener.start()
+
+
+async def wait_for_order_update(order_id, timeout):
+    """
+    Wait up to `timeout` seconds for notify_order_update(order_id).
+    Returns True if notified, False on timeout. On Postgres the wakeup
+    reaches every process through LISTEN/NOTIFY; on other databases only
+    waiters in the notifying process are woken. Either way callers must
+    re-check the database afterwards.
+    """
+    if connection.vendor == "postgresql":
+        _ensure_listener()
+    waiter = (asyncio.get_running_loop(), asyncio.Event())
+    with _lock:
+        _waiters[order_id].add(waiter)
+    try:
+        await asyncio.wait_for(waiter[1].wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        with _lock:
+            _waiters[order_id].discard(waiter)
+            if not _waiters[order_id]:
+                del _waiters[order_id]
+
+
+def notify_order_update(order_id):
+    """
+    Wake every request waiting on the given order: in this process directly,
+    and on Postgres in every other process (e.g. the web servers, when the
+    process_mpesa_callbacks worker applies a callback) through NOTIFY.
+    """
+    if connection.vendor == "postgresql":
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, str(order_id)])
+        except DatabaseError:
+            # waiters still see the update when they next re-check the database
+            logger.exception("Could not notify about Order %s", order_id)
+    _wake(order_id)
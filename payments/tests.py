@@ -0,0 +1,93 @@
+import threading
+from unittest import mock
+
+from django.db import connection
+from django.test import TransactionTestCase, skipUnlessDBFeature
+from django.utils import timezone
+
+from app.models import ItemCategory, Items, ItemVariant, MpesaCallback, Order, OrderItem
+
+from .callbacks import process_callback_by_id, process_pending_callbacks
+
+CHECKOUT_REQUEST_ID = "ws_CO_0001"
+
+
+class DuplicateCallbackTests(TransactionTestCase):
+    """
+    Safaricom may deliver the same callback more than once, and the web
+    process and the workers may pick the copies up at the same time.
+    """
+
+    def setUp(self):
+        category = ItemCategory.objects.create(category="Boots")
+        item = Items.objects.create(name="Boot", category=category, price=100)
+        self.variant = ItemVariant.objects.create(item=item, size="42", stock=5)
+        # a swept order: paying it takes its stock out again, so a second
+        # commit would show up as a second reservation
+        self.order = Order.objects.create(
+            total_amount=200,
+            transaction_date=timezone.now(),
+            checkout_request_id=CHECKOUT_REQUEST_ID,
+            stock_status=Order.STOCK_RELEASED,
+        )
+        OrderItem.objects.create(
+            order=self.order, item=item, variant=self.variant, quantity=2
+        )
+
+    def deliver(self):
+        return MpesaCallback.objects.create(
+            checkout_request_id=CHECKOUT_REQUEST_ID,
+            payload={
+                "Body": {
+                    "stkCallback": {
+                        "CheckoutRequestID": CHECKOUT_REQUEST_ID,
+                        "ResultCode": 0,
+                        "CallbackMetadata": {
+                            "Item": [{"Name": "MpesaReceiptNumber", "Value": "RCPT1"}]
+                        },
+                    }
+                }
+            },
+        )
+
+    def assertPaidOnce(self, notify):
+        self.order.refresh_from_db()
+        self.variant.refresh_from_db()
+        self.assertTrue(self.order.is_paid)
+        self.assertEqual(self.order.stock_status, Order.STOCK_COMMITTED)
+        self.assertEqual(self.variant.stock, 3)
+        # notified once per paid transition
+        notify.assert_called_once_with(self.order.id)
+        self.assertFalse(
+            MpesaCallback.objects.exclude(status=MpesaCallback.PROCESSED).exists()
+        )
+
+    @mock.patch("payments.callbacks.notify_order_update")
+    def test_duplicate_callback_is_applied_once(self, notify):
+        first, second = self.deliver(), self.deliver()
+        process_callback_by_id(first.pk)
+        process_callback_by_id(second.pk)
+        self.assertPaidOnce(notify)
+
+    @skipUnlessDBFeature("has_select_for_update")
+    @mock.patch("payments.callbacks.notify_order_update")
+    def test_concurrent_duplicate_callbacks_are_applied_once(self, notify):
+        rows = [self.deliver(), self.deliver()]
+        barrier = threading.Barrier(len(rows))
+
+        def process(pk):
+            try:
+                barrier.wait()
+                process_callback_by_id(pk)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=process, args=(row.pk,)) for row in rows]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # anything a thread left pending is retried the way the worker would
+        MpesaCallback.objects.update(next_attempt_at=timezone.now())
+        process_pending_callbacks()
+        self.assertPaidOnce(notify)
@@ -0,0 +1,86 @@
+import hashlib
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+
+KEY_PREFIX = "store.sessions"
+
+
+class SessionStore(CachedDBStore):
+    """
+    Cached DB sessions that skip redundant writes. SESSION_SAVE_EVERY_REQUEST
+    saves on every page view just to slide the expiry; here the
+    django_session row is only rewritten when the data changed or its expiry
+    is older than SESSION_DB_WRITE_INTERVAL, and unchanged sessions in
+    between touch neither the cache nor the DB.
+    """
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        super().__init__(session_key)
+        # digest of the data as last persisted, and when that happened
+        self._persisted_digest = None
+        self._persisted_at = None
+
+    def _digest(self, data):
+        return hashlib.md5(self.serializer().dumps(data)).hexdigest()
+
+    def _cache_entry(self, data, expiry_age):
+        self._cache.set(
+            self.cache_key,
+            {"data": data, "persisted_at": self._persisted_at},
+            expiry_age,
+        )
+
+    def load(self):
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # invalid cache keys raise on some backends; see cached_db
+            entry = None
+
+        if entry is not None:
+            data = entry["data"]
+            self._persisted_at = entry["persisted_at"]
+        else:
+            s = self._get_session_from_db()
+            if s is None:
+                return {}
+            data = self.decode(s.session_data)
+            # the row's expiry was set SESSION_COOKIE_AGE after its last write
+            self._persisted_at = (
+                s.expire_date - timedelta(seconds=settings.SESSION_COOKIE_AGE)
+            ).timestamp()
+            self._cache_entry(data, self.get_expiry_age(expiry=s.expire_date))
+        self._persisted_digest = self._digest(data)
+        return data
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        digest = self._digest(data)
+        now = time.time()
+        if (
+            not must_create
+            and digest == self._persisted_digest
+            and self._persisted_at is not None
+            and now - self._persisted_at < settings.SESSION_DB_WRITE_INTERVAL
+        ):
+            # unchanged and recently persisted: nothing to write anywhere
+            return
+        # skip cached_db's save, which writes the plain data to the cache
+        super(CachedDBStore, self).save(must_create=must_create)
+        self._persisted_digest = digest
+        self._persisted_at = now
+        self._cache_entry(data, self.get_expiry_age())
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create)
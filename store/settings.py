@@ -59,6 +59,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    # serves pre-rendered catalog pages before the session layer runs
+    "app.middleware.CatalogSnapshotMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -80,6 +82,7 @@ TEMPLATES = [
                 "django.contrib.auth.context_processors.auth",
                 "django.contrib.messages.context_processors.messages",
                 "context_processor.category_context",  # Custom context processor
+                "context_processor.cart_context",
             ],
         },
     },
@@ -110,6 +113,17 @@ DATABASES = {
     }
 }
 
+# Cache
+# File-based so every gunicorn worker on a host sees the same catalog version
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.getenv("CACHE_LOCATION", "/tmp/store_cache"),
+    }
+}
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -167,6 +181,10 @@ LOGOUT_REDIRECT_URL = "logout"
 SESSION_EXPIRE_AT_BROWSER_CLOSE = True
 SESSION_COOKIE_AGE = 86400  # 1 day in seconds
 SESSION_SAVE_EVERY_REQUEST = True
+# cache-backed sessions that only hit the DB when the data changes or the
+# stored expiry is older than SESSION_DB_WRITE_INTERVAL (see store/sessions.py)
+SESSION_ENGINE = "store.sessions"
+SESSION_DB_WRITE_INTERVAL = 15 * 60  # seconds
 
 # MPESA SETTINGS
 MPESA_CONSUMER_KEY = os.getenv("MPESA_CONSUMER_KEY")
@@ -174,7 +192,32 @@ MPESA_CONSUMER_SECRET = os.getenv("MPESA_CONSUMER_SECRET")
 MPESA_PASSKEY = os.getenv("MPESA_PASSKEY")
 MPESA_CALLBACK_URL = os.getenv("MPESA_CALLBACK_URL")
 MPESA_SHORTCODE = os.getenv("MPESA_SHORTCODE")
-MPESA_BASE_URL = "https://sandbox.safaricom.co.ke"
+MPESA_BASE_URL = os.getenv("MPESA_BASE_URL", "https://sandbox.safaricom.co.ke")
+# pooled HTTP client used for all Daraja calls (see cart/mpesa_client.py)
+MPESA_CONNECT_TIMEOUT = 5  # seconds
+MPESA_READ_TIMEOUT = 30  # seconds
+MPESA_POOL_SIZE = 10
+MPESA_MAX_RETRIES = 3
+# STK pushes are sent by `manage.py run_stk_worker`, retried with backoff
+STK_PUSH_MAX_ATTEMPTS = 5
+STK_PUSH_RETRY_BACKOFF = 5  # seconds, doubled after each failed attempt
+# seconds a worker may spend on one push (token fetch, 401 retry and their
+# timeouts) before the job is presumed abandoned
+STK_PUSH_LEASE = 120
+# callbacks are queued by mpesa_callback and applied by `process_mpesa_callbacks`
+MPESA_CALLBACK_MAX_ATTEMPTS = 5
+MPESA_CALLBACK_RETRY_BACKOFF = 2  # seconds, doubled after each failed attempt
+# image copies are made by `process_item_images`, retried when storage fails
+IMAGE_PROCESSING_MAX_ATTEMPTS = 5
+IMAGE_PROCESSING_RETRY_BACKOFF = 30  # seconds, doubled after each failed attempt
+# minutes an unpaid order holds its stock before `sweep_abandoned_orders` frees it
+ORDER_RESERVATION_TIMEOUT = 30
+# pre-rendered home/category pages, see `manage.py build_catalog_snapshots`
+CATALOG_SNAPSHOTS_ENABLED = os.getenv("CATALOG_SNAPSHOTS_ENABLED", "False") == "True"
+CATALOG_SNAPSHOT_ROOT = os.getenv("CATALOG_SNAPSHOT_ROOT", BASE_DIR / "snapshots")
+# seconds a snapshot is served; stock changes send no signals, so older ones fall
+# back to the dynamic page until `sweep_abandoned_orders` re-renders them
+CATALOG_SNAPSHOT_MAX_AGE = int(os.getenv("CATALOG_SNAPSHOT_MAX_AGE", 5 * 60))
 
 LOGGING = {
     "version": 1,